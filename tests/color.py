@@ -0,0 +1,111 @@
+import re
+
+from tests.time import repeat
+from wc3gen.color import (
+    COLOR, RESET, TEXT, WC3Color, decolorize, decolorize_storage, palette, recolor, recolor_storage, register_color,
+    tokenize, visible_length, visible_width, visible_widths, wrap, wrap_storage,
+)
+from wc3gen.wts import wtsStorage
+
+tooltip = '''Switches from |cffcc80ccTower Mode|r back to the previous one.
+
+|cff00ff80Passive|r
+Every |cff00ccff6|r seconds gives to the selected tower |cff00ccff20%|r of the experience required to reaching its next level.
+
+|cffffcc80If the selected tower becomes sold or unable to be upgraded, the mode automatically switches to the previous one.
+
+The active effect of this ability applies to all selected Fountains of Experience with Tower Mode.|r
+'''
+
+assert tokenize('Cost: |cffe2b007200|r Gold') == (
+    (TEXT, 'Cost: '), (COLOR, 'ffe2b007'), (TEXT, '200'), (RESET, ''), (TEXT, ' Gold'),
+), 'String is tokenized wrong'
+assert decolorize('|cff80ccffvk.com/prometheus3375|r.') == 'vk.com/prometheus3375.', 'Color is not removed'
+assert decolorize('|cffffcc80Outer |cff00ccff6|r seconds|r') == 'Outer 6 seconds', 'Nested colors are not removed'
+assert decolorize('Stray |r reset |CFF00CCFFupper') == 'Stray  reset upper', 'Stray codes are not removed'
+assert decolorize('Bar || and |cffxyz|r') == 'Bar || and |cffxyz', 'Escaped bars or invalid codes are changed'
+for string in tooltip, 'Bar || and |cffxyz|r', '|||cff00ccff2||r':
+    assert decolorize(string) == ''.join(value for kind, value in tokenize(string) if kind == TEXT), (
+        'Decolorized string differs from text tokens'
+    )
+
+assert visible_length('Damage: |cff9933cc20|r Magical') == len('Damage: 20 Magical'), 'Visible length is wrong'
+assert visible_length('Bar || and |cffxyz|r') == len('Bar | and |cffxyz'), 'Escaped bar is not counted once'
+assert visible_width('|cff00ff80Passive|r\nEvery |cff00ccff6|r seconds|nshort') == len('Every 6 seconds'), (
+    'Visible width is wrong'
+)
+for string in tooltip, 'Bar || and |cffxyz|r', '|||cff00ccff2||r', '':
+    assert visible_length(string) == len(decolorize(string).replace('||', '|')), 'Visible length differs'
+
+assert wrap('Cost: |cffe2b007200|r Gold', 20) == 'Cost: |cffe2b007200|r Gold', 'Short string is wrapped'
+assert wrap('Deals |cff9933cc20 magical damage|r to enemies', 12) == (
+    'Deals |cff9933cc20|r\n|cff9933ccmagical|r\n|cff9933ccdamage|r to\nenemies'
+), 'Color is not kept across line breaks'
+assert wrap('Line one\nis short||n but this one is long', 10, newline='|n') == (
+    'Line one\nis short||n|nbut this|none is|nlong'
+), 'Lines are wrapped wrong'
+assert wrap('Unbreakable_word', 4) == 'Unbreakable_word', 'Long word is split'
+assert wrap('|cffff0000|r aaa bbb', 3) == '|cffff0000|r aaa\nbbb', 'Line of codes is broken off'
+for string in tooltip, 'Every |cff00ccff6|r seconds gives to the selected tower |cff00ccff20%|r of the experience':
+    wrapped = wrap(string, 30)
+    assert visible_width(wrapped) <= 30, 'Wrapped line is too wide'
+    assert decolorize(wrapped).split() == decolorize(string).split(), 'Words are changed by wrapping'
+
+colored = wrap('Every |cff00ccff6 seconds gives to the selected tower 20%|r of the experience', 16)
+for line in colored.split('\n'):
+    assert line.count('|c') == line.count('|r'), 'Color run is not closed at a line break'
+
+assert recolor('|cff00ccff2|r s |cff9933cc20|r', {'ff00ccff': 'ffffcc00'}) == '|cffffcc002|r s |cff9933cc20|r', (
+    'String is recolored wrong'
+)
+
+storage = wtsStorage.open('sandbox/strings.wts')
+colored = sum('|cffffcc00' in wts.content for wts in storage)
+assert recolor_storage(storage, {'ffffcc00': 'ff00ccff'}) == colored, 'Not all colored strings are recolored'
+assert all('|cffffcc00' not in wts.content for wts in storage), 'Strings are recolored wrong'
+decolorized = decolorize_storage(storage).values()
+assert all('|c' not in content and '|r' not in content for content in decolorized), 'Strings are decolorized wrong'
+wide = sum(width > 40 for width in visible_widths(storage).values())
+assert wrap_storage(storage, 40) == wide, 'Not all wide strings are wrapped'
+assert all(
+    visible_width(wts.content) <= 40 or max(map(len, decolorize(wts.content).split())) > 40 for wts in storage
+), 'Strings are wrapped wrong'
+
+number = register_color('number', WC3Color(0x00, 0xcc, 0xff))
+assert register_color('value', WC3Color(0x00, 0xcc, 0xff)) is number is palette['value'], 'Color is not interned'
+assert number(6) == '|cff00ccff6|r', 'Color is applied wrong'
+assert number.apply_many(range(3), ', ') == '|cff00ccff0|r, |cff00ccff1|r, |cff00ccff2|r', 'Colors are applied wrong'
+assert number.apply_many(()) == '', 'Empty sequence is colored'
+assert number.apply_many(['', 1], ', ') == f'{number("")}, {number(1)}', 'Empty value is colored differently'
+try:
+    register_color('number', WC3Color(0xff, 0xcc, 0x00))
+except ValueError:
+    pass
+else:
+    raise AssertionError('Registered color is replaced')
+
+tooltips = [f'{tooltip}{i}' for i in range(10_000)]
+
+_DecolorizePattern = re.compile(r'\|c[a-f0-9]{8}.*?\|r', re.DOTALL)
+
+
+def regex_decolorize(string: str, /) -> str:
+    return _DecolorizePattern.sub(lambda match: match.group()[10:-2], string)
+
+
+print(f'{len(tooltips):,} tooltips')
+print('regex     ', repeat('[regex_decolorize(s) for s in tooltips]', repeat_=5, number=1, globals_=globals()))
+print('decolorize', repeat('[decolorize(s) for s in tooltips]', repeat_=5, number=1, globals_=globals()))
+print('tokenize  ', repeat(
+    'tokenize.cache_clear(); [tokenize(s) for s in tooltips]', repeat_=5, number=1, globals_=globals(),
+))
+print('length    ', repeat('[visible_length(s) for s in tooltips]', repeat_=5, number=1, globals_=globals()))
+print('stripped  ', repeat('[len(decolorize(s)) for s in tooltips]', repeat_=5, number=1, globals_=globals()))
+print('width     ', repeat('[visible_width(s) for s in tooltips]', repeat_=5, number=1, globals_=globals()))
+print('wrap      ', repeat('[wrap(s, 60) for s in tooltips]', repeat_=5, number=1, globals_=globals()))
+print('cached    ', repeat('[tokenize(s) for s in tooltips]', repeat_=5, number=1, globals_=globals()))
+
+numbers = list(range(10_000))
+print(f'{len(numbers):,} numbers')
+print('apply     ', repeat("', '.join(map(number, numbers))", repeat_=5, number=10, globals_=globals()))
+print('apply_many', repeat("number.apply_many(numbers, ', ')", repeat_=5, number=10, globals_=globals()))
@@ -0,0 +1,99 @@
+import os
+import shutil
+from itertools import chain
+from tempfile import TemporaryDirectory
+
+from wc3gen.mpq import MPQArchive, MPQError
+from wc3gen.wts import map_references, rewrite_map_references, wtsStorage
+
+source = 'sandbox/testmap.w3m'
+
+with MPQArchive(source) as archive:
+    names = list(archive.names())
+    assert 'war3map.wts' in names, 'war3map.wts is not listed in the map'
+    assert 'War3Map.WTS' in archive and 'war3map/wts' not in archive, 'File names are not case-insensitive'
+    for name in names:
+        archive.read(name)
+
+    try:
+        archive.read('war3map.missing')
+    except MPQError:
+        pass
+    else:
+        raise AssertionError('Missing file is read')
+
+    data = archive.read('war3map.wts')
+    assert data.startswith(b'\xef\xbb\xbfSTRING 1\r\n'), 'war3map.wts is not decompressed properly'
+
+    # One archive handle serves several files
+    storage = wtsStorage.open_map(archive)
+    assert archive.read('war3map.j').startswith(b'globals'), 'war3map.j is not decompressed properly'
+
+assert [str(wts) for wts in storage] == [str(wts) for wts in wtsStorage.open_map(source)], 'Strings differ'
+assert len(storage) == data.count(b'\nSTRING ') + 1, 'Not all strings are parsed'
+
+
+def read_all(path: str, /) -> dict[str, bytes]:
+    with MPQArchive(path) as archive:
+        return {name: archive.read(name) for name in chain(archive.names(), ['(attributes)'])}
+
+
+def raw_blocks(path: str, /) -> dict[str, bytes]:
+    # Raw bytes of every file except the string table
+    with MPQArchive(path) as archive, open(path, 'rb') as f:
+        blocks = {}
+        for name in archive.names():
+            if name != 'war3map.wts':
+                offset, packed_size, _, _ = archive._block_table[archive._find(name)]
+                f.seek(archive._offset + offset)
+                blocks[name] = f.read(packed_size)
+
+        return blocks
+
+
+with TemporaryDirectory() as directory:
+    path = os.path.join(directory, 'testmap.w3m')
+    shutil.copy(source, path)
+    files = read_all(path)
+    blocks = raw_blocks(path)
+
+    storage = wtsStorage.open_map(path)
+    storage[1].content = 'Changed map name\n'
+    storage.add('New string\n' * 1000)
+    storage.save_to_map(path)
+    assert raw_blocks(path) == blocks, 'Other files are rewritten'
+    saved = [str(wts) for wts in wtsStorage.open_map(path)]
+    assert saved == [str(wts) for wts in storage], 'Saved strings differ'
+
+    size = os.path.getsize(path)
+    storage.save_to_map(path, compact=True)
+    assert os.path.getsize(path) < size, 'Archive is not compacted'
+    assert [str(wts) for wts in wtsStorage.open_map(path)] == saved, 'Strings differ after compaction'
+    assert {
+        name: data for name, data in read_all(path).items() if name != 'war3map.wts'
+    } == {
+        name: data for name, data in files.items() if name != 'war3map.wts'
+    }, 'Other files differ after compaction'
+
+storage = wtsStorage.open_map(source)
+references = map_references(source)
+assert references == {wts.id for wts in storage}, 'References of the map are scanned wrong'
+orphans = [wts.id for wts in storage.add_many([('Orphan\n', '')] * 3)]
+assert storage.collect_garbage(references) == orphans, 'Unreferenced strings are not collected'
+assert {wts.id for wts in storage} == references, 'Referenced strings are collected'
+
+with TemporaryDirectory() as directory:
+    path = os.path.join(directory, 'testmap.w3m')
+    shutil.copy(source, path)
+    storage = wtsStorage.open_map(path)
+    contents = {wts.id: wts.content for wts in storage}
+    ids = sorted(contents)
+    storage.delete_many(ids[:len(ids) // 2:2])
+    references = map_references(path) & {wts.id for wts in storage}
+    mapping = storage.compact_ids()
+    assert sorted(wts.id for wts in storage) == list(range(1, len(storage) + 1)), 'Ids are not compacted'
+    assert all(storage[new].content == contents[old] for old, new in mapping.items()), 'Strings are renumbered wrong'
+    rewrite_map_references(path, mapping)
+    storage.save_to_map(path)
+    assert map_references(path) >= {mapping.get(id, id) for id in references}, 'References are rewritten wrong'
+    assert [str(wts) for wts in wtsStorage.open_map(path)] == [str(wts) for wts in storage], 'Saved strings differ'
@@ -0,0 +1,36 @@
+import os
+from tempfile import TemporaryDirectory
+
+from wc3gen.mpq import MPQArchive
+from wc3gen.objects import Modification, ObjectData
+from wc3gen.wts import wtsCommentType
+
+source = 'sandbox/testmap.w3m'
+
+with MPQArchive(source) as archive:
+    units = ObjectData.open_map(archive, wtsCommentType.Unit)
+    upgrades = ObjectData.open_map(archive, wtsCommentType.Upgrade)
+    for typ in wtsCommentType:
+        assert len(ObjectData.open_map(archive, typ).custom) > 0, f'No custom objects of type {typ} are read'
+
+    data = archive.read('war3map.w3u')
+
+assert list(units.custom) == ['H000', 'h001'], 'Custom units are read wrong'
+paladin = units['H000']
+assert paladin.base == 'Hpal', 'Base rawcode is read wrong'
+assert paladin['unam'] == 'TRIGSTR_008', 'String value is read wrong'
+assert paladin.get('upru') == 16, 'Integer value is read wrong'
+assert paladin.get('umvs') is None, 'Missing field has a value'
+assert list(paladin)[0] == Modification('ides', 3, 0, 0, 'TRIGSTR_006'), 'Modification is read wrong'
+
+levels = [(mod.field, mod.level) for mod in upgrades['R001']][:2]
+assert levels == [('gnsf', 1), ('gnsf', 2)], 'Levels of modifications are read wrong'
+assert upgrades['R001'].get('gnsf', 2) == 'TRIGSTR_062', 'Value of a level is read wrong'
+
+with TemporaryDirectory() as directory:
+    path = os.path.join(directory, 'war3map.w3u')
+    with open(path, 'wb') as f:
+        f.write(data)
+
+    with ObjectData.open(path) as mapped:
+        assert [list(record) for record in mapped] == [list(record) for record in units], 'Mapped file is read wrong'
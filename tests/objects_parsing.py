@@ -0,0 +1,31 @@
+import struct
+
+from tests.time import repeat
+from wc3gen.objects import ObjectData
+
+count = 5_000
+
+
+def generate(count: int, /) -> bytes:
+    # Custom units with 10 string, 10 integer and 10 real modifications each
+    parts = [struct.pack('<iii', 2, 0, count)]
+    for i in range(count):
+        parts.append(struct.pack('<4s4si', b'hfoo', f'x{i:03x}'[-4:].encode(), 30))
+        for k in range(10):
+            parts.append(struct.pack('<4si', f's{k:03}'.encode(), 3))
+            parts.append(f'String value number {k} of unit {i}'.encode() + b'\0\0\0\0\0')
+            parts.append(struct.pack('<4siii', f'i{k:03}'.encode(), 0, i * k, 0))
+            parts.append(struct.pack('<4sifi', f'r{k:03}'.encode(), 1, i / (k + 1), 0))
+
+    return b''.join(parts)
+
+
+data = generate(count)
+objects = ObjectData(data, False)
+assert len(objects) == count, 'Not all objects are parsed'
+assert objects['x00a']['i003'] == 30, 'Values are parsed wrong'
+
+print(f'{count:,} objects, {30 * count:,} modifications, {len(data):,} bytes')
+print('open      ', repeat('ObjectData(data, False)', repeat_=5, number=1, globals_=globals()))
+print('decode all', repeat('[list(record) for record in objects]', repeat_=5, number=1, globals_=globals()))
+print('get one   ', repeat("objects['x00a']['s005']", repeat_=5, number=1_000, globals_=globals()))
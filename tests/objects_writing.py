@@ -0,0 +1,52 @@
+from tests.time import repeat
+from wc3gen.objects import Field, ObjectData, ObjectDataWriter
+from wc3gen.objects.data import INT
+from wc3gen.sheet import Row
+from wc3gen.wts import wtsCommentType
+
+count = 3_000
+
+
+class Minion(Row):
+    name: str = 'minion'
+    rawcode: str
+    max_health: float
+    gold_cost: int
+    description: str
+
+    class Bounty(Row):
+        __prefix__ = 'bounty - '
+        gold: int
+        exp: int
+
+    bounty: Bounty
+
+
+rows = [
+    Minion(f'Minion {i}', f'm{i:03x}', 100. + i / 2, i, None if i % 2 else '', Minion.Bounty(i * 2, i * 3))
+    for i in range(count)
+]
+writer = ObjectDataWriter(
+    wtsCommentType.Unit,
+    {
+        'name': 'unam',
+        'max_health': Field('uhpm', type=INT),
+        'gold_cost': 'ugol',
+        'description': 'ides',
+        'bounty.gold': 'ubba',
+    },
+    base=lambda row: 'hfoo',
+    id='rawcode',
+)
+
+objects = ObjectData(writer.write(rows), False)
+assert list(objects.custom) == [row.rawcode for row in rows], 'Objects are written wrong'
+minion = objects['m00b']
+assert minion['unam'] == 'Minion 11', 'String value is written wrong'
+assert minion['uhpm'] == 106, 'Float value of an integer field is written wrong'
+assert minion['ubba'] == 22, 'Subrow field is written wrong'
+assert minion.get('ides') is None, 'None value is written'
+assert objects['m00a']['ides'] == '', 'Empty string is not written'
+
+print(f'{count:,} objects')
+print('write', repeat('writer.write(rows)', repeat_=5, number=10, globals_=globals()))
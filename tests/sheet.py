@@ -1,3 +1,6 @@
+from gspread import Spreadsheet
+
+from wc3gen.sheet import Row, Sheet, SheetParsingError
 from wc3gen.sheet.functions import column2index, index2column
 
 
@@ -31,3 +34,66 @@ check_conversions(26 * (28 + 25 * 26), 'ZAZ')
 check_conversions(26 * (28 + 25 * 26 + 25), 'ZZZ')
 check_conversions(26 * (28 + 25 * 26 + 25) + 1, 'AAAA')
 check_conversions(26 * (28 + 26 * 26), 'AAAZ')
+
+
+class Cost(Row):
+    __prefix__ = 'Cost '
+
+    gold: int
+    lumber: int
+
+
+class Unit(Row):
+    name: str
+    hp: int = 'Hit Points'
+    cost: Cost
+
+
+class Units(Sheet[Unit]):
+    # Spreadsheet is never fetched, values are passed to parse_values directly
+    spreadsheet = Spreadsheet.__new__(Spreadsheet)
+    ignored_columns = {'note'}
+
+
+def check_parsing():
+    header = ['Cost Lumber', 'Name', 'Note', 'Hit Points', 'Cost Gold']
+    values = [
+        header,
+        ['0', ' Footman ', 'melee', '420', '135'],
+        ['30', 'Rifleman', '', '535', '205'],
+        # Last row is not parsed
+        ['', '', '', '', ''],
+    ]
+    rows = list(Units.parse_values(values))
+    assert rows == [Unit('Footman', 420, Cost(135, 0)), Unit('Rifleman', 535, Cost(205, 30))], f'Got {rows}'
+
+    # Cells are converted in the order of columns
+    values[1][3:] = 'ten', 'lots'
+    try:
+        list(Units.parse_values(values))
+    except SheetParsingError as e:
+        msg = "ValueError at cell D2: invalid literal for int() with base 10: 'ten'"
+        assert str(e) == msg, f'Got {str(e)!r}, must be {msg!r}'
+    else:
+        raise AssertionError('Row with a bad cell is parsed')
+
+    # Cells of a short row are taken one by one, so a bad cell before the missing ones is reported
+    values[1] = ['0', 'Footman']
+    try:
+        list(Units.parse_values(values))
+    except IndexError:
+        pass
+    else:
+        raise AssertionError('Short row is parsed')
+
+    values[1] = ['lots']
+    try:
+        list(Units.parse_values(values))
+    except SheetParsingError as e:
+        msg = "ValueError at cell A2: invalid literal for int() with base 10: 'lots'"
+        assert str(e) == msg, f'Got {str(e)!r}, must be {msg!r}'
+    else:
+        raise AssertionError('Short row with a bad cell is parsed')
+
+
+check_parsing()
@@ -0,0 +1,49 @@
+from tests.time import repeat
+from wc3gen.color import WC3Color, register_color
+from wc3gen.sheet import Row
+from wc3gen.template import Template, TemplateError
+
+count = 50_000
+
+
+class Minion(Row):
+    name: str = 'minion'
+    gold_cost: int
+    damage: float
+
+    class Killed(Row):
+        __prefix__ = 'killed - '
+        gold: int
+        exp: int
+
+    killed: Killed
+
+
+register_color('gold', WC3Color(0xe2, 0xb0, 0x07))
+register_color('number', WC3Color(0x00, 0xcc, 0xff))
+template = Template(
+    'Cost: {gold_cost@gold} Gold\n'
+    'Damage: {damage:.1f@number} {{Magical}}\n'
+    'Bounty: {killed.gold|double@gold} Gold',
+    Minion,
+    formatters={'double': lambda value: value * 2},
+)
+
+rows = [Minion(f'Minion {i}', i, i / 3, Minion.Killed(i, i * 2)) for i in range(count)]
+assert template(rows[10]) == (
+    'Cost: |cffe2b00710|r Gold\n'
+    'Damage: |cff00ccff3.3|r {Magical}\n'
+    'Bounty: |cffe2b00720|r Gold'
+), 'Template is rendered wrong'
+assert Template('{killed.exp}')(rows[3]) == '6', 'Template without row class is rendered wrong'
+
+for source in '{cost}', '{name.gold}', '{name|unknown}', '{name@unknown}', 'Cost {':
+    try:
+        Template(source, Minion)
+    except TemplateError:
+        pass
+    else:
+        raise AssertionError(f'Wrong template {source!r} is compiled')
+
+print(f'{count:,} rows')
+print('render', repeat('template.render_many(rows)', repeat_=5, number=10, globals_=globals()))
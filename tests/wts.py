@@ -0,0 +1,303 @@
+import os
+import shutil
+from tempfile import TemporaryDirectory
+from typing import Optional
+
+from wc3gen.wts import wtsStorage, wtsStorageError, wtsString
+from wc3gen.wts.ids import IdAllocator
+
+source = 'sandbox/strings.wts'
+
+
+def read(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def check_roundtrip(**options: bool):
+    with TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'strings.wts')
+        full = os.path.join(directory, 'full.wts')
+        shutil.copy(source, path)
+
+        storage = wtsStorage.open(path, **options)
+        assert not storage.modified, f'Storage opened with {options} is modified'
+
+        mtime = os.stat(path).st_mtime_ns
+        storage.save(path)
+        assert os.stat(path).st_mtime_ns == mtime, f'Unchanged storage opened with {options} is written'
+
+        storage[5].content = 'Force 2\n'
+        storage[60].content = 'Longer content than before\n'
+        del storage[3]
+        storage.add('New string\n')
+        storage.save(path)
+        storage.save(full, incremental=False)
+        assert read(path) == read(full), f'Incremental save with {options} differs from full save'
+
+        # Files written by the editor on Windows have CRLF line endings
+        with open(path, 'wb') as f:
+            f.write(read(full).replace(b'\r\n', b'\n').replace(b'\n', b'\r\n'))
+
+        storage = wtsStorage.open(path, **options)
+        assert not storage.modified, f'Storage with CRLF line endings opened with {options} is modified'
+        storage.save(path)
+        assert read(path) == read(full), f'Storage with CRLF line endings opened with {options} is saved wrong'
+
+        os.chmod(path, 0o644)
+        storage.save(path, incremental=False)
+        assert os.stat(path).st_mode & 0o777 == 0o644, f'Storage opened with {options} changes file mode on save'
+
+
+check_roundtrip()
+check_roundtrip(lazy=True)
+check_roundtrip(compact=True)
+
+
+def check_snapshot():
+    with TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'strings.wts')
+        snapshot = os.path.join(directory, 'strings.snapshot')
+        shutil.copy(source, path)
+
+        storage = wtsStorage.open(path)
+        storage.dump_snapshot(snapshot)
+        loaded = wtsStorage.load_snapshot(snapshot)
+        assert not loaded.modified, 'Storage loaded from snapshot is modified'
+        assert [str(wts) for wts in loaded] == [str(wts) for wts in storage], 'Snapshot strings differ'
+        for rawcode in {wts.comment_data[1] for wts in storage if wts.comment_data}:
+            assert (
+                    [wts.id for wts in loaded.by_rawcode(rawcode)] == [wts.id for wts in storage.by_rawcode(rawcode)]
+            ), f'Snapshot comment index differs for {rawcode}'
+
+        assert loaded.add('New string\n').id == storage.add('New string\n').id, 'Snapshot free ids differ'
+
+        os.utime(path, ns=(0, 0))
+        wtsStorage.load_snapshot(snapshot)
+
+        with open(path, 'ab') as f:
+            f.write(b'\n')
+
+        try:
+            wtsStorage.load_snapshot(snapshot)
+        except wtsStorageError:
+            pass
+        else:
+            raise AssertionError('Outdated snapshot is loaded')
+
+
+check_snapshot()
+
+
+def check_diff():
+    old = wtsStorage.open(source)
+    new = wtsStorage.open(source, lazy=True)
+    assert not old.diff(new), 'Equal storages differ'
+
+    # Editor deletes a changed string and appends it to the end
+    last = max(wts.id for wts in old)
+    strings = [wtsString(wts.id, wts.content, wts.comment) for wts in old if wts.id not in (3, 5, 6)]
+    strings.append(wtsString(5, 'Force 2\n', old[5].comment))
+    strings.append(wtsString(last + 1, 'Changed description\n', old[6].comment))
+    strings.append(wtsString(last + 2, 'New string\n'))
+    new = wtsStorage(strings)
+    diff = old.diff(new)
+    assert diff.removed == [3], 'Removed strings differ'
+    assert diff.added == [last + 2], 'Added strings differ'
+    assert diff.changed == [(5, 5), (6, last + 1)], 'Changed strings differ'
+    assert diff.moved == [(6, last + 1)], 'Moved strings differ'
+    assert len(list(diff.report())) == 5, 'Report differs'
+
+
+check_diff()
+
+
+def check_merge():
+    base = wtsStorage.open(source)
+    last = max(wts.id for wts in base)
+    # Generator changes and adds strings
+    ours = wtsStorage.open(source)
+    ours[5].content = 'Generated force\n'
+    ours[6].content = 'Generated description\n'
+    generated = ours.add('Generated string\n')
+    # Editor deletes changed strings and appends them to the end, adds its own strings
+    strings = [wtsString(wts.id, wts.content, wts.comment) for wts in base if wts.id not in (3, 6)]
+    strings.append(wtsString(last + 2, 'Edited description\n', base[6].comment))
+    strings.append(wtsString(generated.id, 'Edited string\n'))
+    theirs = wtsStorage(strings)
+    del theirs[4]
+
+    merged, conflicts = wtsStorage.merge3(base, ours, theirs)
+    assert 3 not in merged and 4 not in merged, 'Deleted strings are merged'
+    assert merged[5].content == 'Generated force\n', 'Our change is not merged'
+    assert [(c.id, c.ours.content, c.theirs.content) for c in conflicts] == [
+        (last + 2, 'Generated description\n', 'Edited description\n'),
+    ], 'Conflicts differ'
+    assert merged[last + 2].content == 'Generated description\n', 'Conflicting string is not taken from ours'
+    # Both added a string with the same id; map files of the editor refer to theirs
+    assert merged[generated.id].content == 'Edited string\n', 'Their added string does not keep its id'
+    assert [wts.id for wts in merged.search('Generated string')] == [last + 3], 'Our added string does not get a new id'
+
+
+check_merge()
+
+
+def check_transform():
+    def shout(wts: wtsString) -> Optional[wtsString]:
+        if wts.id % 10 == 0:
+            return None
+
+        # Reverse the order of ids to make sorting necessary
+        return wtsString(1000 - wts.id, wts.content.upper(), wts.comment)
+
+    with TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'strings.wts')
+        expected = os.path.join(directory, 'expected.wts')
+        storage = wtsStorage(filter(None, map(shout, wtsStorage.open(source))))
+        storage.save(expected)
+        count = wtsStorage.transform(source, path, shout, sort=True, run_size=7)
+        assert count == len(storage), 'Number of transformed strings differs'
+        assert read(path) == read(expected), 'Sorted transform differs from save'
+
+        os.chmod(path, 0o644)
+        wtsStorage.transform(path, path, lambda wts: wts)
+        assert read(path) == read(expected), 'Transform in place changes the file'
+        assert os.stat(path).st_mode & 0o777 == 0o644, 'Transform in place changes file mode'
+
+
+check_transform()
+
+
+def check_views():
+    storage = wtsStorage.open(source)
+    texts = [str(wts) for wts in storage]
+    paladin = [str(wts) for wts in storage.by_rawcode('H000')]
+    view = storage.snapshot()
+    storage.update_many({5: 'Force 2\n', 6: 'Changed description\n'})
+    deleted = storage[3]
+    del storage[3]
+    deleted.content = 'Changed after deletion\n'
+    storage.add('New string\n')
+    # Deleted id is taken again by a string with the same comment
+    hotkey = storage[7]
+    del storage[7]
+    assert storage.add('W\n', hotkey.comment).id == 7, 'Deleted id is not reused'
+    assert [str(wts) for wts in view] == texts, 'View reflects changes of the storage'
+    assert len(view) == len(texts), 'View length is wrong'
+    assert view.find(*view[6].comment_data).content == 'My cool description\n', 'View comment index is changed'
+    assert view.find(*hotkey.comment_data).content == 'Q\n', 'View finds a string added after it'
+    assert [str(wts) for wts in view.by_rawcode('H000')] == paladin, 'View rawcode index is changed'
+
+    later = storage.snapshot()
+    player = storage[4].content
+    del storage[4]
+    assert storage.compact_ids()[5] == 4, 'Strings are not renumbered'
+    storage[4].content = 'Force 3\n'
+    assert later[4].content == player and later[5].content == 'Force 2\n', 'View reflects renumbering'
+    assert [str(wts) for wts in view] == texts, 'Earlier view is changed'
+
+    # Strings of the storage are not sorted by ids
+    comment = '// Units: H000 (My paladin), Name (Name)'
+    storage = wtsStorage(wtsString(id, f'String {id}\n', comment if id != 12 else '') for id in (10, 1, 7, 3, 12))
+    view = storage.snapshot()
+    del storage[7]
+    del storage[10]
+    storage.add('New string\n', comment)
+    assert [wts.id for wts in view] == [10, 1, 7, 3, 12], 'View changes the order of strings'
+    assert [wts.id for wts in view.by_rawcode('H000')] == [10, 1, 7, 3], 'View changes the order of the rawcode index'
+
+
+check_views()
+
+
+def check_ids():
+    allocator = IdAllocator([2, 3, 7, 8, 12])
+    assert list(allocator.gaps()) == [(1, 2), (4, 7), (9, 12)], 'Gaps are wrong'
+    assert allocator.allocate() == 1 and allocator.allocate() == 4, 'Smallest ids are not allocated first'
+    assert allocator.reserve(2) == range(9, 11), 'Largest gap is not used'
+    assert allocator.reserve(4) == range(13, 17), 'Interval is not taken from the tail'
+    allocator.release(3)
+    allocator.release(2)
+    allocator.release(4)
+    assert list(allocator.gaps()) == [(2, 7), (11, 12)], 'Released ids are not merged'
+    allocator.release(16)
+    assert 16 in allocator and allocator.tail == 16, 'Tail is not moved'
+    try:
+        allocator.release(11)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('Free id is released')
+
+    # Every other id is free
+    count = 200_000
+    allocator = IdAllocator(range(2, 2 * count + 1, 2))
+    ids = [allocator.allocate() for _ in range(count)]
+    assert ids == list(range(1, 2 * count, 2)), 'Ids are allocated in wrong order'
+    for id in reversed(ids):
+        allocator.release(id)
+
+    assert list(allocator.gaps()) == list(zip(ids, range(2, 2 * count + 1, 2))), 'Gaps are restored wrong'
+
+
+check_ids()
+
+
+def check_add_many():
+    storage = wtsStorage.open(source)
+    count = len(storage)
+    try:
+        storage.add_many([('New string\n', ''), (None, '')])
+    except TypeError:
+        pass
+    else:
+        raise AssertionError('String with non-string content is added')
+
+    assert len(storage) == count and not storage.modified, 'Strings are added despite invalid content'
+
+    texts = [str(wts) for wts in storage]
+    for method, argument, error in (
+            (storage.update_many, {5: 'Force 2\n', 10_000: 'Missing string\n'}, wtsStorageError),
+            (storage.update_many, [(5, 'Force 2\n'), (6, None)], TypeError),
+            (storage.delete_many, [3, 10_000], wtsStorageError),
+    ):
+        try:
+            method(argument)
+        except error:
+            pass
+        else:
+            raise AssertionError(f'{method.__name__} accepts {argument}')
+
+        assert [str(wts) for wts in storage] == texts and not storage.modified, (
+            f'{method.__name__} changes strings despite failing for {argument}'
+        )
+
+
+check_add_many()
+
+
+def check_search(**options: bool):
+    def expected(text: str) -> list[int]:
+        return sorted(wts.id for wts in storage if text in wts.content)
+
+    def check(*texts: str):
+        for text in texts:
+            assert [wts.id for wts in storage.search(text)] == expected(text), (
+                f'Search of {text!r} in storage opened with {options} differs from a scan'
+            )
+
+    storage = wtsStorage.open(source, **options)
+    # Texts shorter than three characters are searched without the index
+    check('Force', 'paladin', 'e', 'Fo', '', 'Absent text')
+    storage[5].content = 'Forcefield\n'
+    storage[6].content = 'No longer a description\n'
+    del storage[4]
+    storage.add('Force of the new string\n')
+    storage.add_many([('Added force\n', ''), ('Fo\n', '')])
+    check('Force', 'force', 'description', 'Fo', 'Player 1')
+    assert [wts.id for wts in storage.search('Player 1')] == [], 'Deleted string is found'
+
+
+check_search()
+check_search(compact=True)
+check_search(lazy=True)
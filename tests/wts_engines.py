@@ -0,0 +1,53 @@
+import os
+import tracemalloc
+from tempfile import TemporaryDirectory
+
+from tests.time import repeat
+from wc3gen.wts import wtsStorage
+
+source = 'sandbox/strings.wts'
+count = 100_000
+workers = max(2, os.cpu_count())
+
+
+def scale(path: str, /):
+    # Repeat strings of the source with new ids and rawcodes until there are enough of them
+    strings = sorted(wtsStorage.open(source))
+    with open(path, 'w', encoding=wtsStorage.file_encoding) as f:
+        for i in range(count):
+            wts = strings[i % len(strings)]
+            comment = wts.comment
+            if comment:
+                colon = comment.index(':')
+                comment = f'{comment[:colon + 2]}{i // len(strings):04x}{comment[colon + 6:]}'
+
+            f.write(f'STRING {i + 1}\n{comment}{{\n{wts.content}}}\n\n')
+
+
+with TemporaryDirectory() as directory:
+    path = os.path.join(directory, 'strings.wts')
+    scale(path)
+
+    lines = [str(wts) for wts in wtsStorage.open(path)]
+    regex = [str(wts) for wts in wtsStorage.open(path, engine='regex')]
+    parallel = [str(wts) for wts in wtsStorage.open(path, workers=workers)]
+    assert lines == regex, 'Engines parse strings differently'
+    assert lines == parallel, 'Parallel parsing gives different strings'
+
+    # Compact storage keeps strings in arrays and takes about three times less memory
+    memory = {}
+    for compact in False, True:
+        tracemalloc.start()
+        storage = wtsStorage.open(path, compact=compact)
+        memory[compact] = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del storage
+
+    print(f'{count:,} strings, memory: full {memory[False] / 2 ** 20:.1f} MB, compact {memory[True] / 2 ** 20:.1f} MB')
+    assert memory[True] * 3 < memory[False], 'Compact storage does not save memory'
+
+    print(f'{count:,} strings, opening')
+    for engine in 'lines', 'regex':
+        print(f'{engine: <5}', repeat(f'wtsStorage.open(path, engine={engine!r})', repeat_=5, number=1, globals_=globals()))
+
+    print(f'{workers} workers', repeat('wtsStorage.open(path, workers=workers)', repeat_=5, number=1, globals_=globals()))
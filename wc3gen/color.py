@@ -1,64 +1,309 @@
 import re
-from typing import final
+from collections.abc import Iterable, Iterator, Mapping
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Final, Optional, TYPE_CHECKING, Union, final
 
 from misclib.utils.color import Color
 
+if TYPE_CHECKING:
+    from .wts import wtsStorage
+
 
 @final
 class WC3Color(Color):
+    """Color of Warcraft III text; colors are treated as immutable, so their codes are computed once"""
+
+    @property
+    def code(self, /) -> str:
+        """Hex digits of the color code: alpha, red, green and blue"""
+        return self.prefix[2:]
+
+    @property
+    def prefix(self, /) -> str:
+        """Color code |cAARRGGBB which starts a colored text"""
+        try:
+            return self._prefix
+        except AttributeError:
+            prefix = f'|c{self.alpha:02x}{self.red:02x}{self.green:02x}{self.blue:02x}'
+            object.__setattr__(self, '_prefix', prefix)
+            return prefix
+
     def apply(self, string: str, /) -> str:
-        return f'|c{self.alpha:02x}{self.red:02x}{self.green:02x}{self.blue:02x}{string}|r'
+        return f'{self.prefix}{string}|r'
 
     __call__ = apply
 
+    def apply_many(self, values: Iterable[Any], /, sep: str = '') -> str:
+        """
+        Color every value converted to a string and join them with the separator.
+        Colored values are joined at once without making a colored string for each of them;
+        empty values are colored as apply colors them, an empty iterable gives an empty string.
+        """
+        strings = list(map(str, values))
+        if not strings:
+            return ''
+
+        prefix = self.prefix
+        return f'{prefix}{f"|r{sep}{prefix}".join(strings)}|r'
+
+
+# Interned colors by codes and registered colors by names
+_interned: dict[str, WC3Color] = {}
+_palette: dict[str, WC3Color] = {}
+palette: Final[Mapping[str, WC3Color]] = MappingProxyType(_palette)
+
+
+def intern_color(color: WC3Color, /) -> WC3Color:
+    """Return the first interned color equal to the given one, so equal colors share the computed code"""
+    return _interned.setdefault(color.code, color)
+
+
+def register_color(name: str, color: WC3Color, /) -> WC3Color:
+    """Register the color in the palette under the name and return its interned instance"""
+    color = intern_color(color)
+    registered = _palette.setdefault(name, color)
+    if registered is not color:
+        raise ValueError(f'name {name!r} is already registered for color {registered.code}')
+
+    return color
+
+
+# Token kinds
+TEXT: Final[int] = 0
+COLOR: Final[int] = 1  # |cAARRGGBB, value is lowercase hex digits
+RESET: Final[int] = 2  # |r, value is empty
+
+Token = tuple[int, str]
 
-_DecolorizePattern = re.compile(r'\|c[a-f0-9]{8}.*?\|r', re.DOTALL)
+# Escaped bars are matched to be kept in text
+_CodePattern = re.compile(r'(\|\||\|[cC][0-9a-fA-F]{8}|\|[rR])')
+# Codes without escaped bars, used to remove codes from strings without them
+_StripPattern = re.compile(r'\|[cC][0-9a-fA-F]{8}|\|[rR]')
+_reset_token: Final[Token] = RESET, ''
 
 
-def _decolorize_repl(match: re.Match, /) -> str:
-    return match.group()[10:-2]
+@lru_cache(maxsize=1 << 16)
+def tokenize(string: str, /) -> tuple[Token, ...]:
+    """
+    Split a string into text, color and reset tokens in one pass.
+    Colors do not nest: a color code replaces the current color, a reset returns the default color
+    and has no effect outside of a colored text. Escaped bars || remain in text.
+    """
+    parts = _CodePattern.split(string)
+    tokens = []
+    text = parts[0]
+    for i in range(1, len(parts), 2):
+        code = parts[i]
+        if code == '||':
+            text += code + parts[i + 1]
+            continue
+
+        if text:
+            tokens.append((TEXT, text))
+
+        tokens.append((COLOR, code[2:].lower()) if len(code) == 10 else _reset_token)
+        text = parts[i + 1]
+
+    if text:
+        tokens.append((TEXT, text))
+
+    return tuple(tokens)
 
 
 def decolorize(string: str, /) -> str:
-    return _DecolorizePattern.sub(_decolorize_repl, string)
-
-
-# print(decolorize(
-#     '''
-# Created by |cff80ccffvk.com/prometheus3375|r.
-# Contact me via Telegram: |cff80ccff@Prometheus3375|r.
-#
-# Special thanks:
-# |cffff3333youtube.com/2kxaoc|r
-# |cffccccccxgm.guru/p/wc3|r
-#     '''
-# ))
-#
-# print(decolorize(
-#     '''
-# Cost: |cffe2b007200|r Gold
-# Income Gain: |cff76a5af+40|r
-# Build Limit: |cff00ccff∞|r
-#
-# Attack
-# Damage: |cff9933cc20|r Magical
-# Cooldown: |cff00ccff2|r s
-# Range: |cff00ccff3|r
-# Max. Targets: |cff00ccff1|r
-# Targets Allowed: All
-# Explodes Targets: Yes
-#     '''
-# ))
-#
-# print(decolorize(
-#     '''
-# Switches from |cffcc80ccTower Mode|r back to the previous one.
-#
-# |cff00ff80Passive|r
-# Every |cff00ccff6|r seconds gives to the selected tower |cff00ccff20%|r of the experience required to reaching its next level.
-#
-# |cffffcc80If the selected tower becomes sold or unable to be upgraded, the mode automatically switches to the previous one.
-#
-# The active effect of this ability applies to all selected Fountains of Experience with Tower Mode.|r
-#     '''
-# ))
+    """Remove all color codes and resets from the string"""
+    if '|' not in string:
+        return string
+    if '||' in string:
+        return ''.join([value for kind, value in tokenize(string) if kind == TEXT])
+
+    # Same as joining text tokens, but does not create tokens
+    return _StripPattern.sub('', string)
+
+
+def visible_length(string: str, /) -> int:
+    """
+    Return the number of shown characters of the string: color codes and resets are not counted,
+    an escaped bar || is counted once. The string without codes is not built.
+    """
+    if '|' not in string:
+        return len(string)
+
+    codes = _CodePattern.findall(string)
+    return len(string) - sum(map(len, codes)) + codes.count('||')
+
+
+# Codes and line breaks; |n is a line break in game
+_LinePattern = re.compile(r'\|\||\|[cC][0-9a-fA-F]{8}|\|[rR]|\|n|\n')
+
+
+def visible_width(string: str, /) -> int:
+    """Return the greatest visible length of lines of the string; lines are separated by new lines and |n"""
+    if '|' not in string and '\n' not in string:
+        return len(string)
+
+    width = 0
+    start = 0  # start of the current line
+    hidden = 0  # length of codes in the current line
+    for match in _LinePattern.finditer(string):
+        code = match.group()
+        if code == '\n' or code == '|n':
+            width = max(width, match.start() - start - hidden)
+            start = match.end()
+            hidden = 0
+        else:
+            hidden += 1 if code == '||' else len(code)
+
+    return max(width, len(string) - start - hidden)
+
+
+# Separators are spaces and line breaks, escaped bars are consumed in pairs, so ||n is not a line break
+_PiecePattern = re.compile(r'(?P<sep> +|\|n|\n)|(?:[^ |\n]|\|\||\|(?!n))+')
+
+# Word is its parts, visible length and the color before it; separators are strings
+_Word = tuple[list[str], int, Optional[str]]
+
+
+def _words(string: str, /) -> Iterator[Union[_Word, str]]:
+    color = None
+    parts = []
+    length = 0
+    before = None
+    for kind, value in tokenize(string):
+        if kind != TEXT:
+            if not parts:
+                before = color
+            if kind == COLOR:
+                parts.append(f'|c{value}')
+                color = value
+            else:
+                parts.append('|r')
+                color = None
+
+            continue
+
+        for match in _PiecePattern.finditer(value):
+            piece = match.group()
+            if match.lastgroup:
+                if parts:
+                    yield parts, length, before
+                    parts = []
+                    length = 0
+
+                yield piece
+            else:
+                if not parts:
+                    before = color
+                parts.append(piece)
+                length += len(piece) - piece.count('||')
+
+    if parts:
+        yield parts, length, before
+
+
+def wrap(string: str, width: int, /, *, newline: str = '\n') -> str:
+    """
+    Break lines of the string longer than the visible width at spaces; words longer than the width are not split.
+    Codes are not counted in the width and are never split. If a line is broken inside a colored text,
+    the color is reset at the end of the line and applied again at the start of the next line.
+    Existing line breaks are kept, spaces at inserted line breaks are removed.
+    """
+    if width < 1:
+        raise ValueError(f'width must be positive, got {width}')
+    if visible_width(string) <= width:
+        return string
+
+    parts = []
+    line_width = 0
+    has_words = False  # whether the current line has a word, lines are never broken before the first one
+    spaces = ''
+    for item in _words(string):
+        if isinstance(item, str):
+            if item[0] == ' ':
+                spaces += item
+            else:
+                parts.append(spaces)
+                parts.append(item)
+                line_width = 0
+                has_words = False
+                spaces = ''
+
+            continue
+
+        word, length, color = item
+        if has_words and length and line_width + len(spaces) + length > width:
+            if color is None:
+                parts.append(newline)
+            else:
+                parts.append(f'|r{newline}|c{color}')
+            line_width = 0
+        else:
+            parts.append(spaces)
+            line_width += len(spaces)
+
+        parts.extend(word)
+        line_width += length
+        # Words made only of codes are not shown, a line with them has no words yet
+        if length:
+            has_words = True
+
+        spaces = ''
+
+    parts.append(spaces)
+    return ''.join(parts)
+
+
+def recolor(string: str, colors: Mapping[str, Union[str, WC3Color]], /) -> str:
+    """
+    Replace color codes of the string according to the mapping of lowercase hex digits
+    to new colors or their hex digits. Other codes are written in lowercase.
+    """
+    if '|' not in string:
+        return string
+
+    parts = []
+    for kind, value in tokenize(string):
+        if kind == TEXT:
+            parts.append(value)
+        elif kind == COLOR:
+            color = colors.get(value, value)
+            parts.append(f'|c{color if isinstance(color, str) else color.code}')
+        else:
+            parts.append('|r')
+
+    return ''.join(parts)
+
+
+def decolorize_storage(storage: 'wtsStorage', /) -> dict[int, str]:
+    """Return decolorized contents of all strings of the storage by id"""
+    return {wts.id: decolorize(wts.content) for wts in storage}
+
+
+def recolor_storage(storage: 'wtsStorage', colors: Mapping[str, Union[str, WC3Color]], /) -> int:
+    """Recolor contents of all strings of the storage and return the number of changed strings"""
+    changed = {}
+    for wts in storage:
+        content = recolor(wts.content, colors)
+        if content != wts.content:
+            changed[wts.id] = content
+
+    storage.update_many(changed)
+    return len(changed)
+
+
+def visible_widths(storage: 'wtsStorage', /) -> dict[int, int]:
+    """Return visible widths of contents of all strings of the storage by id"""
+    return {wts.id: visible_width(wts.content) for wts in storage}
+
+
+def wrap_storage(storage: 'wtsStorage', width: int, /, *, newline: str = '\n') -> int:
+    """Wrap contents of all strings of the storage and return the number of changed strings"""
+    changed = {}
+    for wts in storage:
+        content = wrap(wts.content, width, newline=newline)
+        if content != wts.content:
+            changed[wts.id] = content
+
+    storage.update_many(changed)
+    return len(changed)
@@ -0,0 +1,2 @@
+from .archive import MPQArchive, MPQError
+from .writer import compact_archive, replace_file
@@ -0,0 +1,245 @@
+import bz2
+import struct
+import zlib
+from collections.abc import Iterator
+from typing import BinaryIO, Final, Optional, final
+
+from .crypto import FILE_KEY, NAME_A, NAME_B, TABLE_OFFSET, decrypt, file_key, hash_string
+
+# Block flags
+IMPLODE: Final[int] = 0x00000100
+COMPRESS: Final[int] = 0x00000200
+ENCRYPTED: Final[int] = 0x00010000
+FIX_KEY: Final[int] = 0x00020000
+SINGLE_UNIT: Final[int] = 0x01000000
+DELETE_MARKER: Final[int] = 0x02000000
+SECTOR_CRC: Final[int] = 0x04000000
+EXISTS: Final[int] = 0x80000000
+
+# Block indexes of hash table entries which do not refer to a file
+EMPTY: Final[int] = 0xFFFFFFFF
+DELETED: Final[int] = 0xFFFFFFFE
+
+# Compression types
+ZLIB: Final[int] = 0x02
+BZIP2: Final[int] = 0x10
+
+HEADER_MAGIC: Final[bytes] = b'MPQ\x1a'
+USER_DATA_MAGIC: Final[bytes] = b'MPQ\x1b'
+# Archive header can be located only at offsets which are multiples of this value
+HEADER_ALIGNMENT: Final[int] = 512
+
+Header = struct.Struct('<4sIIHHIIII')
+HeaderExtension = struct.Struct('<QHH')
+UserDataHeader = struct.Struct('<4sIII')
+HashEntry = struct.Struct('<IIHHI')
+BlockEntry = struct.Struct('<IIII')
+
+HASH_TABLE_KEY: Final[int] = hash_string('(hash table)', FILE_KEY)
+BLOCK_TABLE_KEY: Final[int] = hash_string('(block table)', FILE_KEY)
+
+LISTFILE: Final[str] = '(listfile)'
+
+# Hash A, hash B, locale, platform and block index
+_HashEntry = tuple[int, int, int, int, int]
+# Offset relative to the archive, compressed size, file size and flags
+_BlockEntry = tuple[int, int, int, int]
+
+
+@final
+class MPQError(Exception):
+    __module__ = 'builtins'
+
+
+@final
+class MPQArchive:
+    """
+    Read-only MPQ archive such as a Warcraft III map.
+    The archive file is kept open, hash and block tables are read once;
+    files are read and decompressed on request.
+    """
+    __slots__ = '_file', '_path', '_offset', '_header', '_extension', '_sector_size', '_hash_table', '_block_table'
+
+    def __init__(self, filepath: str, /):
+        self._path = filepath
+        self._file: BinaryIO = open(filepath, 'rb')
+        try:
+            self._read_tables()
+        except BaseException:
+            self._file.close()
+            raise
+
+    def _read_tables(self, /):
+        f = self._file
+        offset = 0
+        while True:
+            f.seek(offset)
+            data = f.read(Header.size)
+            if len(data) < Header.size:
+                raise MPQError(f'file {self._path!r} is not an MPQ archive')
+
+            if data[:4] == USER_DATA_MAGIC:
+                _, _, header_offset, _ = UserDataHeader.unpack_from(data)
+                offset += header_offset
+                continue
+
+            if data[:4] == HEADER_MAGIC:
+                break
+
+            offset += HEADER_ALIGNMENT
+
+        header = Header.unpack(data)
+        (
+            _, header_size, _, _, sector_shift,
+            hash_table_offset, block_table_offset, hash_table_size, block_table_size,
+        ) = header
+        extension = None
+        if header_size >= Header.size + HeaderExtension.size:
+            extension = HeaderExtension.unpack(f.read(HeaderExtension.size))
+            _, hash_table_high, block_table_high = extension
+            hash_table_offset |= hash_table_high << 32
+            block_table_offset |= block_table_high << 32
+
+        if hash_table_size & (hash_table_size - 1):
+            raise MPQError(f'hash table size of archive {self._path!r} is not a power of 2, got {hash_table_size}')
+
+        self._offset = offset
+        self._header = header
+        self._extension = extension
+        self._sector_size = 512 << sector_shift
+        data = self._read_table(hash_table_offset, hash_table_size, HASH_TABLE_KEY, 'hash')
+        self._hash_table: list[_HashEntry] = list(HashEntry.iter_unpack(data))
+        data = self._read_table(block_table_offset, block_table_size, BLOCK_TABLE_KEY, 'block')
+        self._block_table: list[_BlockEntry] = list(BlockEntry.iter_unpack(data))
+
+    def _read_table(self, offset: int, size: int, key: int, name: str, /) -> bytes:
+        self._file.seek(self._offset + offset)
+        data = self._file.read(size * 16)
+        if len(data) != size * 16:
+            raise MPQError(f'{name} table of archive {self._path!r} is truncated')
+
+        return decrypt(data, key)
+
+    @property
+    def path(self, /) -> str:
+        return self._path
+
+    def close(self, /):
+        self._file.close()
+
+    def __enter__(self, /) -> 'MPQArchive':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb, /):
+        self.close()
+
+    def _lookup(self, name: str, /) -> tuple[Optional[int], Optional[int]]:
+        # Return position of the hash table entry of the file and index of its block.
+        # If there is no such file, return the first free position in the hash table instead
+        table = self._hash_table
+        mask = len(table) - 1
+        start = hash_string(name, TABLE_OFFSET) & mask
+        hash_a = hash_string(name, NAME_A)
+        hash_b = hash_string(name, NAME_B)
+        free = None
+        for i in range(len(table)):
+            position = (start + i) & mask
+            a, b, _, _, block = table[position]
+            if block == EMPTY:
+                return position if free is None else free, None
+
+            if block == DELETED:
+                if free is None:
+                    free = position
+            elif a == hash_a and b == hash_b:
+                if block < len(self._block_table) and self._block_table[block][3] & EXISTS:
+                    return position, block
+
+        return free, None
+
+    def _find(self, name: str, /) -> Optional[int]:
+        # Return index of the block of the file or None if there is no such file
+        return self._lookup(name)[1]
+
+    def __contains__(self, name: str, /) -> bool:
+        return self._find(name) is not None
+
+    def names(self, /) -> Iterator[str]:
+        """Iterate over names listed in the list file of the archive which are present in it"""
+        if LISTFILE not in self:
+            return iter(())
+
+        names = self.read(LISTFILE).decode('utf-8', 'replace').replace(';', '\n').splitlines()
+        return (name for name in dict.fromkeys(names) if name and name in self)
+
+    def read(self, name: str, /) -> bytes:
+        """Read and decompress a file of the archive"""
+        index = self._find(name)
+        if index is None:
+            raise MPQError(f'file {name!r} is not present in archive {self._path!r}')
+
+        offset, packed_size, size, flags = self._block_table[index]
+        if flags & IMPLODE:
+            raise MPQError(f'file {name!r} of archive {self._path!r} is imploded, this compression is not supported')
+
+        key = 0
+        if flags & ENCRYPTED:
+            key = file_key(name)
+            if flags & FIX_KEY:
+                key = (key + offset ^ size) & 0xFFFFFFFF
+
+        f = self._file
+        f.seek(self._offset + offset)
+        data = f.read(packed_size)
+        if len(data) != packed_size:
+            raise MPQError(f'file {name!r} of archive {self._path!r} is truncated')
+
+        if flags & SINGLE_UNIT:
+            if flags & ENCRYPTED:
+                data = decrypt(data, key)
+            if flags & COMPRESS and packed_size < size:
+                data = self._decompress(name, data)
+
+            return data
+
+        sector_size = self._sector_size
+        count = (size + sector_size - 1) // sector_size
+        if flags & COMPRESS:
+            table_size = count + 1 + (1 if flags & SECTOR_CRC else 0)
+            table = data[:4 * table_size]
+            if flags & ENCRYPTED:
+                table = decrypt(table, key - 1 & 0xFFFFFFFF)
+
+            bounds = struct.unpack(f'<{table_size}I', table)
+        else:
+            bounds = [min(i * sector_size, packed_size) for i in range(count + 1)]
+
+        sectors = []
+        for i in range(count):
+            sector = data[bounds[i]:bounds[i + 1]]
+            if flags & ENCRYPTED:
+                sector = decrypt(sector, key + i & 0xFFFFFFFF)
+            if flags & COMPRESS and len(sector) < min(sector_size, size - i * sector_size):
+                sector = self._decompress(name, sector)
+
+            sectors.append(sector)
+
+        data = b''.join(sectors)
+        if len(data) != size:
+            raise MPQError(f'file {name!r} of archive {self._path!r} is damaged, '
+                           f'expected {size} bytes after decompression, got {len(data)}')
+
+        return data
+
+    def _decompress(self, name: str, data: bytes, /) -> bytes:
+        compression = data[0]
+        try:
+            if compression == ZLIB:
+                return zlib.decompress(data[1:])
+            if compression == BZIP2:
+                return bz2.decompress(data[1:])
+        except (zlib.error, OSError, ValueError) as e:
+            raise MPQError(f'file {name!r} of archive {self._path!r} is damaged: {e}') from None
+
+        raise MPQError(f'compression {compression:#04x} of file {name!r} '
+                       f'in archive {self._path!r} is not supported')
@@ -0,0 +1,93 @@
+import sys
+from array import array
+from typing import Final
+
+MASK: Final[int] = 0xFFFFFFFF
+
+# Hash types
+TABLE_OFFSET: Final[int] = 0
+NAME_A: Final[int] = 1
+NAME_B: Final[int] = 2
+FILE_KEY: Final[int] = 3
+
+
+def _crypt_table() -> array:
+    table = array('I', bytes(4 * 0x500))
+    seed = 0x00100001
+    for i in range(0x100):
+        for k in range(5):
+            seed = (seed * 125 + 3) % 0x2AAAAB
+            high = (seed & 0xFFFF) << 16
+            seed = (seed * 125 + 3) % 0x2AAAAB
+            table[i + k * 0x100] = high | seed & 0xFFFF
+
+    return table
+
+
+_CryptTable: Final[array] = _crypt_table()
+
+
+def hash_string(string: str, typ: int, /) -> int:
+    """Return MPQ hash of the string; case and kind of path separators are ignored"""
+    seed1 = 0x7FED7FED
+    seed2 = 0xEEEEEEEE
+    table = _CryptTable
+    offset = typ << 8
+    for char in string.replace('/', '\\').encode('utf-8').upper():
+        seed1 = (table[offset + char] ^ (seed1 + seed2)) & MASK
+        seed2 = (char + seed1 + seed2 + (seed2 << 5) + 3) & MASK
+
+    return seed1
+
+
+def file_key(name: str, /) -> int:
+    """Return encryption key of a file by its name in an archive; only the base name matters"""
+    return hash_string(name.replace('/', '\\').rpartition('\\')[2], FILE_KEY)
+
+
+def _words(data: bytes, /) -> array:
+    # MPQ data is little-endian
+    words = array('I', data)
+    if sys.byteorder == 'big':
+        words.byteswap()
+
+    return words
+
+
+def _bytes(words: array, /) -> bytes:
+    if sys.byteorder == 'big':
+        words.byteswap()
+
+    return words.tobytes()
+
+
+def decrypt(data: bytes, key: int, /) -> bytes:
+    """Decrypt the data; trailing bytes which do not fill a 32-bit word are left as is"""
+    size = len(data) & ~3
+    words = _words(data[:size])
+    table = _CryptTable
+    seed2 = 0xEEEEEEEE
+    for i in range(len(words)):
+        seed2 = (seed2 + table[0x400 + (key & 0xFF)]) & MASK
+        value = words[i] ^ (key + seed2) & MASK
+        words[i] = value
+        key = ((~key << 21) + 0x11111111 & MASK) | key >> 11
+        seed2 = (value + seed2 + (seed2 << 5) + 3) & MASK
+
+    return _bytes(words) + data[size:]
+
+
+def encrypt(data: bytes, key: int, /) -> bytes:
+    """Encrypt the data; trailing bytes which do not fill a 32-bit word are left as is"""
+    size = len(data) & ~3
+    words = _words(data[:size])
+    table = _CryptTable
+    seed2 = 0xEEEEEEEE
+    for i in range(len(words)):
+        seed2 = (seed2 + table[0x400 + (key & 0xFF)]) & MASK
+        value = words[i]
+        words[i] = value ^ (key + seed2) & MASK
+        key = ((~key << 21) + 0x11111111 & MASK) | key >> 11
+        seed2 = (value + seed2 + (seed2 << 5) + 3) & MASK
+
+    return _bytes(words) + data[size:]
@@ -0,0 +1,193 @@
+import os
+import shutil
+import struct
+import zlib
+from itertools import chain
+from tempfile import mkstemp
+from typing import BinaryIO, Final
+
+from .archive import (
+    BLOCK_TABLE_KEY, BlockEntry, COMPRESS, ENCRYPTED, EXISTS, FIX_KEY, HASH_TABLE_KEY, Header, HeaderExtension,
+    HashEntry, LISTFILE, MPQArchive, MPQError, SECTOR_CRC, SINGLE_UNIT, ZLIB, _BlockEntry, _HashEntry,
+)
+from .crypto import MASK, NAME_A, NAME_B, decrypt, encrypt, file_key, hash_string
+
+# Files which are usually not listed in the list file
+_special_files: Final[tuple[str, ...]] = LISTFILE, '(attributes)', '(signature)'
+
+
+def _pack(data: bytes, sector_size: int, /) -> bytes:
+    # Split data into sectors compressed with zlib and prepend the table of their offsets.
+    # Sectors which do not become smaller are stored as is
+    if not data:
+        return b''
+
+    sectors = []
+    for start in range(0, len(data), sector_size):
+        sector = data[start:start + sector_size]
+        compressed = zlib.compress(sector, 9)
+        if len(compressed) + 1 < len(sector):
+            sector = bytes((ZLIB,)) + compressed
+
+        sectors.append(sector)
+
+    offsets = [4 * (len(sectors) + 1)]
+    for sector in sectors:
+        offsets.append(offsets[-1] + len(sector))
+
+    return struct.pack(f'<{len(offsets)}I', *offsets) + b''.join(sectors)
+
+
+def _write_tables(
+        f: BinaryIO,
+        archive: MPQArchive,
+        hash_table: list[_HashEntry],
+        hash_table_offset: int,
+        block_table: list[_BlockEntry],
+        block_table_offset: int,
+        archive_size: int,
+        /,
+):
+    # Write encrypted tables at the given offsets and the header which refers to them
+    for offset in hash_table_offset, block_table_offset, archive_size:
+        if offset > MASK:
+            raise MPQError(f'archive {archive.path!r} cannot be larger than 4 GiB')
+
+    f.seek(archive._offset + hash_table_offset)
+    f.write(encrypt(b''.join(HashEntry.pack(*entry) for entry in hash_table), HASH_TABLE_KEY))
+    f.seek(archive._offset + block_table_offset)
+    f.write(encrypt(b''.join(BlockEntry.pack(*entry) for entry in block_table), BLOCK_TABLE_KEY))
+
+    magic, header_size, _, version, sector_shift, *_ = archive._header
+    f.seek(archive._offset)
+    f.write(Header.pack(
+        magic, header_size, archive_size, version, sector_shift,
+        hash_table_offset, block_table_offset, len(hash_table), len(block_table),
+    ))
+    if archive._extension is not None:
+        f.write(HeaderExtension.pack(0, 0, 0))
+
+
+def _check_writable(archive: MPQArchive, /):
+    version = archive._header[3]
+    if version > 1 or archive._extension is not None and archive._extension[0]:
+        raise MPQError(f'archive {archive.path!r} has format version {version} '
+                       f'or an extended block table, it cannot be changed')
+
+
+def replace_file(filepath: str, name: str, data: bytes, /):
+    """
+    Put a file into an archive instead of the file with the same name or as a new one.
+    File data is compressed with zlib and appended to the archive, then hash and block tables are patched;
+    other files are not read or rewritten. Space taken by the replaced data is freed only by compact_archive.
+    """
+    with MPQArchive(filepath) as archive:
+        _check_writable(archive)
+        hash_table = list(archive._hash_table)
+        block_table = list(archive._block_table)
+        position, block = archive._lookup(name)
+        packed = _pack(data, archive._sector_size)
+
+    if position is None:
+        raise MPQError(f'cannot add file {name!r}, hash table of archive {filepath!r} is full')
+
+    _, _, _, _, _, hash_table_offset, block_table_offset, *_ = archive._header
+    with open(filepath, 'r+b') as f:
+        offset = f.seek(0, os.SEEK_END) - archive._offset
+        f.write(packed)
+        end = offset + len(packed)
+        entry = offset, len(packed), len(data), EXISTS | COMPRESS if data else EXISTS
+        if block is None:
+            # Block table grows, move it to the end of the archive
+            hash_table[position] = hash_string(name, NAME_A), hash_string(name, NAME_B), 0, 0, len(block_table)
+            block_table.append(entry)
+            block_table_offset = end
+            end += 16 * len(block_table)
+        else:
+            block_table[block] = entry
+
+        _write_tables(f, archive, hash_table, hash_table_offset, block_table, block_table_offset, end)
+
+
+def _rekey(data: bytes, flags: int, size: int, sector_size: int, old_key: int, new_key: int, /) -> bytes:
+    # Re-encrypt raw data of a block with a new key without decompressing it
+    if flags & SINGLE_UNIT:
+        return encrypt(decrypt(data, old_key), new_key)
+
+    count = (size + sector_size - 1) // sector_size
+    if flags & COMPRESS:
+        table_size = 4 * (count + 1 + (1 if flags & SECTOR_CRC else 0))
+        table = decrypt(data[:table_size], old_key - 1 & MASK)
+        bounds = struct.unpack(f'<{table_size // 4}I', table)
+        parts = [encrypt(table, new_key - 1 & MASK)]
+    else:
+        bounds = [min(i * sector_size, len(data)) for i in range(count + 1)]
+        parts = []
+
+    for i in range(len(bounds) - 1):
+        sector = decrypt(data[bounds[i]:bounds[i + 1]], old_key + i & MASK)
+        parts.append(encrypt(sector, new_key + i & MASK))
+
+    return b''.join(parts)
+
+
+def compact_archive(filepath: str, /):
+    """
+    Rewrite an archive without space taken by replaced and deleted files.
+    Blocks are copied without decompression and keep their indexes.
+    Blocks encrypted with a key based on their offset are re-encrypted,
+    names of such files must be present in the list file.
+    """
+    with MPQArchive(filepath) as archive:
+        _check_writable(archive)
+        archive_offset = archive._offset
+        hash_table = archive._hash_table
+        block_table = list(archive._block_table)
+        sector_size = archive._sector_size
+        names = {}
+        if any(flags & ENCRYPTED and flags & FIX_KEY for *_, flags in block_table):
+            names = {archive._find(name): name for name in chain(archive.names(), _special_files) if name in archive}
+
+        source = archive._file
+        fd, temp = mkstemp(dir=os.path.dirname(os.path.abspath(filepath)))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                # Data before the archive and its header are copied, the header is updated at the end
+                header_size = archive._header[1]
+                source.seek(0)
+                f.write(source.read(archive_offset + header_size))
+                pos = header_size
+                order = sorted(range(len(block_table)), key=lambda i: block_table[i][0])
+                for index in order:
+                    offset, packed_size, size, flags = block_table[index]
+                    if not flags & EXISTS:
+                        block_table[index] = 0, 0, 0, 0
+                        continue
+
+                    source.seek(archive_offset + offset)
+                    data = source.read(packed_size)
+                    if flags & ENCRYPTED and flags & FIX_KEY and pos != offset:
+                        name = names.get(index)
+                        if name is None:
+                            raise MPQError(f'cannot move encrypted block {index} of archive {filepath!r}, '
+                                           f'its file name is not present in the list file')
+
+                        key = file_key(name)
+                        old_key = (key + offset ^ size) & MASK
+                        new_key = (key + pos ^ size) & MASK
+                        data = _rekey(data, flags, size, sector_size, old_key, new_key)
+
+                    f.write(data)
+                    block_table[index] = pos, packed_size, size, flags
+                    pos += packed_size
+
+                hash_table_offset = pos
+                block_table_offset = hash_table_offset + 16 * len(hash_table)
+                end = block_table_offset + 16 * len(block_table)
+                _write_tables(f, archive, hash_table, hash_table_offset, block_table, block_table_offset, end)
+        except BaseException:
+            os.remove(temp)
+            raise
+
+    shutil.copymode(filepath, temp)
+    os.replace(temp, filepath)
@@ -0,0 +1,2 @@
+from .data import Modification, ObjectData, ObjectDataError, ObjectRecord
+from .writer import Field, ObjectDataWriter
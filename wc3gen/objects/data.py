@@ -0,0 +1,270 @@
+import os
+import struct
+from array import array
+from collections.abc import Iterator
+from mmap import ACCESS_READ, mmap
+from typing import Final, NamedTuple, Optional, Union, final
+
+from ..mpq import MPQArchive
+from ..wts.string import wtsCommentType
+
+# Value types
+INT: Final[int] = 0
+REAL: Final[int] = 1
+UNREAL: Final[int] = 2
+STRING: Final[int] = 3
+
+# Object data files of each object type
+object_files: Final[dict[wtsCommentType, str]] = {
+    wtsCommentType.Ability: 'w3a',
+    wtsCommentType.BuffEffect: 'w3h',
+    wtsCommentType.Destructible: 'w3b',
+    wtsCommentType.Doodad: 'w3d',
+    wtsCommentType.Item: 'w3t',
+    wtsCommentType.Unit: 'w3u',
+    wtsCommentType.Upgrade: 'w3q',
+}
+# Modifications in these files also have level and data column
+extended_files: Final[frozenset[str]] = frozenset(('w3a', 'w3d', 'w3q'))
+
+_Int = struct.Struct('<i')
+_Real = struct.Struct('<f')
+_ObjectHeader = struct.Struct('<4s4si')
+_Modification = struct.Struct('<4si')
+_ExtendedModification = struct.Struct('<4siii')
+_Set = struct.Struct('<ii')
+
+# Columns of the modification table of a record
+_FIELD, _TYPE, _LEVEL, _COLUMN, _SET, _START, _END = range(7)
+_WIDTH: Final[int] = 7
+
+Value = Union[int, float, str]
+
+
+@final
+class ObjectDataError(Exception):
+    __module__ = 'builtins'
+
+
+class Modification(NamedTuple):
+    field: str
+    type: int
+    level: int
+    column: int
+    value: Value
+    # Flags of the set the modification belongs to, used since version 3
+    set: int = 0
+
+
+def _rawcode(code: int, /) -> str:
+    return code.to_bytes(4, 'little').decode('latin-1')
+
+
+def _code(rawcode: str, /) -> int:
+    return int.from_bytes(rawcode.encode('latin-1'), 'little')
+
+
+@final
+class ObjectRecord:
+    """
+    Modifications of one object.
+    Only positions of modification values in the file are stored, values are decoded on access.
+    """
+    __slots__ = '_data', 'base', 'id', '_mods'
+
+    def __init__(self, data: 'ObjectData', base: str, id: str, mods: array, /):
+        self._data = data
+        self.base = base
+        # Rawcode of a custom object or the base rawcode for a changed original object
+        self.id = id
+        self._mods = mods
+
+    def __len__(self, /) -> int:
+        return len(self._mods) // _WIDTH
+
+    def _value(self, row: int, /) -> Value:
+        mods = self._mods
+        i = row * _WIDTH
+        return self._data._value(mods[i + _TYPE], mods[i + _START], mods[i + _END])
+
+    def __iter__(self, /) -> Iterator[Modification]:
+        mods = self._mods
+        for row in range(len(self)):
+            i = row * _WIDTH
+            yield Modification(
+                _rawcode(mods[i + _FIELD]), mods[i + _TYPE], mods[i + _LEVEL], mods[i + _COLUMN],
+                self._value(row), mods[i + _SET],
+            )
+
+    def fields(self, /) -> Iterator[str]:
+        mods = self._mods
+        return (_rawcode(mods[i]) for i in range(_FIELD, len(mods), _WIDTH))
+
+    def get(self, field: str, /, level: int = 0, default: Value = None) -> Optional[Value]:
+        """Return the value of the field at the given level or default if the field is not modified"""
+        code = _code(field)
+        mods = self._mods
+        for i in range(0, len(mods), _WIDTH):
+            if mods[i + _FIELD] == code and mods[i + _LEVEL] == level:
+                return self._value(i // _WIDTH)
+
+        return default
+
+    def __getitem__(self, field: str, /) -> Value:
+        value = self.get(field)
+        if value is None:
+            raise KeyError(field)
+
+        return value
+
+    def __repr__(self, /) -> str:
+        return f'{self.__class__.__name__}(base={self.base!r}, id={self.id!r}, modifications={len(self)})'
+
+
+@final
+class ObjectData:
+    """
+    Object data file such as war3map.w3u.
+    The file is read once into records of original and custom objects keyed by rawcode.
+    File data is not copied, values are decoded from it on access.
+    """
+    __slots__ = '_buffer', '_view', 'extended', 'version', 'original', 'custom'
+
+    def __init__(self, buffer, /, extended: bool):
+        self._buffer = buffer
+        self._view = memoryview(buffer)
+        self.extended = extended
+        if len(buffer) < 4:
+            raise ObjectDataError('object data is truncated')
+
+        self.version = _Int.unpack_from(buffer)[0]
+        if not 1 <= self.version <= 3:
+            raise ObjectDataError(f'object data version must be from 1 to 3, got {self.version}')
+
+        try:
+            pos = 4
+            self.original, pos = self._read_table(pos, True)
+            self.custom, pos = self._read_table(pos, False)
+        except struct.error:
+            raise ObjectDataError('object data is truncated') from None
+
+    def _read_table(self, pos: int, original: bool, /) -> tuple[dict[str, ObjectRecord], int]:
+        buffer = self._buffer
+        view = self._view
+        version = self.version
+        modification = _ExtendedModification if self.extended else _Modification
+        unpack_mod = modification.unpack_from
+        mod_size = modification.size
+        find = buffer.find
+        records = {}
+        (count,) = _Int.unpack_from(buffer, pos)
+        pos += 4
+        for _ in range(count):
+            base, new, mod_count = _ObjectHeader.unpack_from(buffer, pos)
+            pos += _ObjectHeader.size
+            if version >= 3:
+                # mod_count is the number of sets
+                sets = mod_count
+                flags, mod_count = _Set.unpack_from(buffer, pos)
+                pos += _Set.size
+            else:
+                sets = 1
+                flags = 0
+
+            mods = array('q')
+            for k in range(sets):
+                if k > 0:
+                    flags, mod_count = _Set.unpack_from(buffer, pos)
+                    pos += _Set.size
+
+                for _ in range(mod_count):
+                    if self.extended:
+                        field, typ, level, column = unpack_mod(buffer, pos)
+                    else:
+                        field, typ = unpack_mod(buffer, pos)
+                        level = column = 0
+
+                    start = pos + mod_size
+                    if typ == STRING:
+                        end = find(b'\0', start)
+                        if end == -1:
+                            raise ObjectDataError(f'string value of field {field!r} is not terminated')
+
+                        pos = end + 1
+                    elif 0 <= typ < STRING:
+                        end = pos = start + 4
+                    else:
+                        raise ObjectDataError(f'unknown type {typ} of field {field!r}')
+
+                    # Skip end marker
+                    pos += 4
+                    mods.extend((int.from_bytes(field, 'little'), typ, level, column, flags, start, end))
+
+            if len(view) < pos:
+                raise ObjectDataError('object data is truncated')
+
+            base = base.decode('latin-1')
+            id = base if original else new.decode('latin-1')
+            records[id] = ObjectRecord(self, base, id, mods)
+
+        return records, pos
+
+    def _value(self, typ: int, start: int, end: int, /) -> Value:
+        if typ == STRING:
+            return str(self._view[start:end], 'utf-8')
+
+        if typ == INT:
+            return _Int.unpack_from(self._buffer, start)[0]
+
+        return _Real.unpack_from(self._buffer, start)[0]
+
+    @classmethod
+    def open(cls, filepath: str, /) -> 'ObjectData':
+        """Open an object data file; its extension determines whether modifications have levels"""
+        extended = os.path.splitext(filepath)[1][1:].lower() in extended_files
+        with open(filepath, 'rb') as f:
+            try:
+                buffer = mmap(f.fileno(), 0, access=ACCESS_READ)
+            except ValueError:
+                # Empty files cannot be mapped
+                buffer = b''
+
+        return cls(buffer, extended)
+
+    @classmethod
+    def open_map(cls, archive: Union[str, MPQArchive], typ: wtsCommentType, /) -> 'ObjectData':
+        """Read object data of objects of the given type from a map archive"""
+        if isinstance(archive, str):
+            with MPQArchive(archive) as archive:
+                return cls.open_map(archive, typ)
+
+        extension = object_files[typ]
+        return cls(archive.read(f'war3map.{extension}'), extension in extended_files)
+
+    def close(self, /):
+        self._view.release()
+        if isinstance(self._buffer, mmap):
+            self._buffer.close()
+
+    def __enter__(self, /) -> 'ObjectData':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb, /):
+        self.close()
+
+    def __len__(self, /) -> int:
+        return len(self.original) + len(self.custom)
+
+    def __iter__(self, /) -> Iterator[ObjectRecord]:
+        yield from self.original.values()
+        yield from self.custom.values()
+
+    def __contains__(self, rawcode: str, /) -> bool:
+        return rawcode in self.custom or rawcode in self.original
+
+    def __getitem__(self, rawcode: str, /) -> ObjectRecord:
+        record = self.custom.get(rawcode)
+        if record is None:
+            return self.original[rawcode]
+
+        return record
@@ -0,0 +1,170 @@
+import struct
+from collections.abc import Callable, Iterable, Mapping
+from operator import attrgetter
+from typing import Any, Final, NamedTuple, Optional, Union, final
+
+from ..mpq import replace_file
+from ..wts.string import wtsCommentType
+from .data import INT, ObjectDataError, REAL, STRING, Value, extended_files, object_files
+
+# Version of written files
+VERSION: Final[int] = 2
+
+_Int = struct.Struct('<i')
+_ObjectHeader = struct.Struct('<4s4si')
+# Modification headers followed by a value
+_Modification = struct.Struct('<4si')
+_IntModification = struct.Struct('<4sii')
+_RealModification = struct.Struct('<4sif')
+_ExtendedModification = struct.Struct('<4siii')
+_ExtendedIntModification = struct.Struct('<4siiii')
+_ExtendedRealModification = struct.Struct('<4siiif')
+# Null byte after a string value
+_TERMINATOR_SIZE: Final[int] = 1
+# Every modification ends with 4 bytes which are left zero
+_END_SIZE: Final[int] = 4
+
+
+class Field(NamedTuple):
+    """Modification of an object which value is taken from a row field"""
+    id: str
+    level: int = 0
+    column: int = 0
+    # If not specified, inferred from the value: int and bool are INT, float is REAL, str is STRING.
+    # Float values of INT modifications are rounded
+    type: Optional[int] = None
+
+
+_RawcodeGetter = Union[str, Callable[[Any], str]]
+
+
+def _rawcode(rawcode: str, /) -> bytes:
+    data = rawcode.encode('latin-1')
+    if len(data) != 4:
+        raise ObjectDataError(f'rawcode must consist of 4 characters, got {rawcode!r}')
+
+    return data
+
+
+def _value_type(value: Value, /) -> int:
+    if isinstance(value, str):
+        return STRING
+    if isinstance(value, int):
+        return INT
+    if isinstance(value, float):
+        return REAL
+
+    raise TypeError(f'value of a modification must be int, float or str, got {type(value)}')
+
+
+@final
+class ObjectDataWriter:
+    """
+    Writer of object data files from rows.
+    Mapping binds paths of row fields to modifications, such as 'killed.gold' for field gold of subrow killed.
+    Base and id are paths of row fields or functions of a row which return base and new rawcodes of an object;
+    an object which id is equal to its base is written as a changed original object.
+    Fields which values are None are not written.
+    """
+    __slots__ = '_fields', '_base', '_id', 'typ', 'extended'
+
+    def __init__(
+            self,
+            typ: wtsCommentType,
+            mapping: Mapping[str, Union[str, Field]],
+            /,
+            *,
+            base: _RawcodeGetter,
+            id: _RawcodeGetter,
+    ):
+        self.typ = typ
+        self.extended = object_files[typ] in extended_files
+        self._base = attrgetter(base) if isinstance(base, str) else base
+        self._id = attrgetter(id) if isinstance(id, str) else id
+        self._fields = []
+        for path, field in mapping.items():
+            if isinstance(field, str):
+                field = Field(field)
+            if field.type is not None and not INT <= field.type <= STRING:
+                raise ValueError(f'unknown type {field.type} of modification {field.id!r}')
+
+            self._fields.append((attrgetter(path), _rawcode(field.id), field.level, field.column, field.type))
+
+    def write(self, rows: Iterable[Any], /) -> bytes:
+        """Return object data file with objects made from rows"""
+        header_size = (_ExtendedModification if self.extended else _Modification).size
+        fixed_size = header_size + 4 + _END_SIZE
+        string_size = header_size + _TERMINATOR_SIZE + _END_SIZE
+        # Values are collected and measured in one pass over rows, then packed into a buffer of the exact size
+        tables = [], []
+        size = _Int.size * 3
+        for row in rows:
+            base = _rawcode(self._base(row))
+            id = _rawcode(self._id(row))
+            mods = []
+            for get, field, level, column, typ in self._fields:
+                value = get(row)
+                if value is None:
+                    continue
+
+                if typ is None:
+                    typ = _value_type(value)
+                if typ == STRING:
+                    value = value.encode('utf-8')
+                    size += string_size + len(value)
+                else:
+                    if typ == INT and isinstance(value, float):
+                        value = round(value)
+
+                    size += fixed_size
+
+                mods.append((field, typ, level, column, value))
+
+            size += _ObjectHeader.size
+            tables[id != base].append((base, id, mods))
+
+        buffer = bytearray(size)
+        _Int.pack_into(buffer, 0, VERSION)
+        pos = _Int.size
+        for original, objects in zip((True, False), tables):
+            _Int.pack_into(buffer, pos, len(objects))
+            pos += _Int.size
+            for base, id, mods in objects:
+                _ObjectHeader.pack_into(buffer, pos, base, b'\0\0\0\0' if original else id, len(mods))
+                pos += _ObjectHeader.size
+                pos = self._pack_modifications(buffer, pos, mods)
+
+        return bytes(buffer)
+
+    def _pack_modifications(self, buffer: bytearray, pos: int, mods: list, /) -> int:
+        extended = self.extended
+        for field, typ, level, column, value in mods:
+            if typ == STRING:
+                if extended:
+                    _ExtendedModification.pack_into(buffer, pos, field, typ, level, column)
+                else:
+                    _Modification.pack_into(buffer, pos, field, typ)
+
+                pos += _ExtendedModification.size if extended else _Modification.size
+                buffer[pos:pos + len(value)] = value
+                pos += len(value) + _TERMINATOR_SIZE
+            elif extended:
+                struct_ = _ExtendedIntModification if typ == INT else _ExtendedRealModification
+                struct_.pack_into(buffer, pos, field, typ, level, column, value)
+                pos += struct_.size
+            else:
+                struct_ = _IntModification if typ == INT else _RealModification
+                struct_.pack_into(buffer, pos, field, typ, value)
+                pos += struct_.size
+
+            pos += _END_SIZE
+
+        return pos
+
+    def write_file(self, rows: Iterable[Any], filepath: str, /):
+        with open(filepath, 'wb') as f:
+            f.write(self.write(rows))
+
+    def save_to_map(self, rows: Iterable[Any], filepath: str, /):
+        """Replace the object data file of the writer type in a map archive"""
+        replace_file(filepath, f'war3map.{object_files[self.typ]}', self.write(rows))
@@ -1,4 +1,4 @@
-from collections.abc import Iterator, Sequence
+from collections.abc import Callable, Iterator, Sequence
 from typing import Any, Generic, Optional, TypeVar, final, overload
 from weakref import WeakKeyDictionary
 
@@ -11,8 +11,13 @@ from .row import Row
 from .wrapper import SpreadsheetWrapper
 
 
+_Parser = Callable[[Sequence[Sequence[str]]], Iterator[Row]]
+
+
 class _SheetMeta(EmptySlots):
     __instances__ = WeakKeyDictionary()
+    # Compiled row parsers of sheets by column indexes of titles
+    __parsers__ = WeakKeyDictionary()
     spreadsheet: Spreadsheet
     index: Optional[int]
     title: Optional[str]
@@ -69,6 +74,58 @@ def _fool_pycharm(o):
     return o
 
 
+def _row_constructor(row_class: type[Row], variables: dict[str, str], globals_: dict[str, Any], /) -> str:
+    name = f'R{len(globals_)}'
+    globals_[name] = row_class
+    args = [variables[title] for title in row_class.titles_.values()]
+    args.extend(_row_constructor(subrow, variables, globals_) for subrow in row_class.subrows_.values())
+    return f'{name}({", ".join(args)})'
+
+
+def _compile_parser(cls: type['Sheet'], names: dict[str, int], /) -> _Parser:
+    """
+    Compile a function which parses all rows of values with the given column indexes of titles.
+    Cells are taken and converted one by one in the order of columns as the row parser did before;
+    rows and subrows are created by positional calls.
+    """
+    conversions = cls.row_class.titles2conversions_
+    globals_ = dict(
+        __builtins__={},
+        range=range,
+        len=len,
+        Exception=Exception,
+        SheetParsingError=SheetParsingError,
+        cell=cls.cell,
+    )
+    variables = {name: f'v{j}' for name, j in names.items()}
+    cells = []
+    for name, j in names.items():
+        globals_[f'c{j}'] = conversions[name]
+        # Cell is taken outside of try, so a short row raises IndexError after errors of previous cells
+        cells.append(
+            f'        v{j} = row[{j - 1}].strip()\n'
+            '        try:\n'
+            f'            v{j} = c{j}(v{j})\n'
+            '        except Exception as e:\n'
+            # https://stackoverflow.com/a/24752607/14369408
+            f"            raise SheetParsingError(f'{{e.__class__.__name__}} at cell {{cell(i, {j})}}: {{e}}') from e\n"
+        )
+
+    constructor = _row_constructor(cls.row_class, variables, globals_)
+    source = (
+        'def parse(values, /):\n'
+        '    for i in range(2, len(values)):\n'
+        '        row = values[i - 1]\n'
+        f'{"".join(cells)}'
+        '\n'
+        f'        yield {constructor}\n'
+    )
+    exec(source, globals_)
+    parse = globals_['parse']
+    parse.__qualname__ = f'{cls.__qualname__}.parse'
+    return parse
+
+
 _Row_co = TypeVar('_Row_co', covariant=True)
 
 
@@ -171,21 +228,14 @@ class Sheet(Generic[_Row_co], metaclass=_fool_pycharm(_SheetMeta)):
             raise SheetParsingError(f'in sheet {cls.__name__!r} {msg}')
         # endregion
 
-        for i in range(2, len(values)):
-            row = values[i - 1]
-            args = {}
-            for name, j in names.items():
-                value = row[j - 1].strip()
-                convert = row_class.titles2conversions_[name]
-                try:
-                    value = convert(value)
-                except Exception as e:
-                    # https://stackoverflow.com/a/24752607/14369408
-                    raise SheetParsingError(f'{e.__class__.__name__} at cell {cls.cell(i, j)}: {e}') from e
-
-                args[name] = value
-
-            yield row_class.from_titles_(args)
+        # Rows are parsed by a function compiled once for every arrangement of columns
+        parsers = cls.__class__.__parsers__.setdefault(cls, {})
+        key = tuple(names[title] for title in titles)
+        parser = parsers.get(key)
+        if parser is None:
+            parser = parsers[key] = _compile_parser(cls, names)
+
+        return parser(values)
 
     def __len__(self, /) -> int:
         return len(self._rows)
@@ -0,0 +1,126 @@
+import re
+from collections.abc import Callable, Iterable, Mapping
+from typing import Any, Optional, final
+
+from misclib.functions import repr_collection
+from .color import WC3Color, palette
+
+# Placeholder is {path|formatter:spec@style}, formatters, spec and style are optional.
+# Path is a field name or a dotted path through subrows such as killed.gold
+_PlaceholderPattern = re.compile(
+    r'\{\{|}}|'
+    r'\{(?P<path>[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)*)'
+    r'(?P<formatters>(?:\|[A-Za-z_]\w*)*)'
+    r'(?::(?P<spec>[^{}@]*))?'
+    r'(?:@(?P<style>[A-Za-z_]\w*))?}'
+    r'|[{}]'
+)
+
+Formatter = Callable[[Any], Any]
+
+
+@final
+class TemplateError(Exception):
+    __module__ = 'builtins'
+
+
+def _row_expression(path: str, row_class: Optional[type], /) -> str:
+    # Fields of rows are accessed by indexes if the row class is known
+    if row_class is None:
+        return f'row.{path}'
+
+    expression = 'row'
+    cls = row_class
+    previous = None
+    for field in path.split('.'):
+        if cls is None:
+            raise TemplateError(f'field {previous!r} of path {path!r} is not a subrow')
+        if field not in cls.fields_:
+            raise TemplateError(f'{cls.__qualname__} does not have field {field!r} of path {path!r}')
+
+        expression = f'{expression}[{cls.fields_.index(field)}]'
+        cls = cls.subrows_.get(field)
+        previous = field
+
+    return expression
+
+
+@final
+class Template:
+    """
+    Tooltip template such as 'Cost: {gold@gold} Gold'; {{ and }} are literal braces.
+    Placeholder {path|formatter:spec@style} takes a field of a row by its path,
+    passes it through formatters from left to right, formats the result by the format spec
+    and colors it with the style. Styles are colors of the palette or of the given mapping.
+    A template is compiled once into a function which renders a row with a single f-string.
+    If the row class is specified, paths are checked and fields are accessed by indexes.
+    """
+    __slots__ = 'source', 'row_class', '_render'
+
+    def __init__(
+            self,
+            source: str,
+            /,
+            row_class: Optional[type] = None,
+            *,
+            formatters: Mapping[str, Formatter] = None,
+            styles: Mapping[str, WC3Color] = None,
+    ):
+        self.source = source
+        self.row_class = row_class
+        formatters = {} if formatters is None else formatters
+        styles = palette if styles is None else styles
+        globals_ = {'__builtins__': {}}
+        parts = []
+        pos = 0
+        unknown = []
+        for match in _PlaceholderPattern.finditer(source):
+            # Text between placeholders has no braces
+            parts.append(source[pos:match.start()])
+            pos = match.end()
+            text = match.group()
+            if text == '{{' or text == '}}':
+                parts.append(text)
+                continue
+            if match.group('path') is None:
+                raise TemplateError(f'unmatched {text!r} at position {match.start()} of template {source!r}')
+
+            expression = _row_expression(match.group('path'), row_class)
+            for name in match.group('formatters').split('|')[1:]:
+                if name not in formatters:
+                    unknown.append(name)
+                    continue
+
+                key = f'_f{len(globals_)}'
+                globals_[key] = formatters[name]
+                expression = f'{key}({expression})'
+
+            spec = match.group('spec')
+            placeholder = f'{{{expression}:{spec}}}' if spec else f'{{{expression}}}'
+            style = match.group('style')
+            if style is None:
+                parts.append(placeholder)
+            elif style in styles:
+                parts.append(f'{styles[style].prefix}{placeholder}|r')
+            else:
+                unknown.append(style)
+
+        if unknown:
+            noun, rep = repr_collection(unknown, 'formatter or style', 'formatters or styles')
+            raise TemplateError(f'unknown {noun} {rep} in template {source!r}')
+
+        parts.append(source[pos:])
+        # Expressions contain no quotes and backslashes, hence repr escapes only literal text
+        code = f'def render(row, /):\n    return f{"".join(parts)!r}\n'
+        exec(code, globals_)
+        self._render: Callable[[Any], str] = globals_['render']
+
+    def __call__(self, row: Any, /) -> str:
+        return self._render(row)
+
+    def render_many(self, rows: Iterable[Any], /) -> list[str]:
+        """Render every row, for example, every row of a sheet"""
+        return list(map(self._render, rows))
+
+    def __repr__(self, /) -> str:
+        return f'{self.__class__.__name__}({self.source!r})'
@@ -1,2 +1,7 @@
-from .storage import wtsStorage, wtsStorageError
+from .diff import wtsDiff
+from .merge import wtsConflict
+from .references import (
+    map_references, rewrite_files, rewrite_map_references, rewrite_references, scan_files, scan_references,
+)
+from .storage import wtsStorage, wtsStorageError, wtsStorageView
 from .string import wtsCommentField, wtsCommentType, wtsString
@@ -0,0 +1,151 @@
+import os
+import re
+from array import array
+from collections.abc import Iterable, Iterator, Sequence
+from typing import Final, Optional, final
+
+from .string import wtsString
+
+BOM: Final[bytes] = b'\xef\xbb\xbf'
+# wtsStorage.save writes files in text mode, hence uses the platform newline
+NEWLINE: Final[bytes] = os.linesep.encode()
+
+# Block flags
+RAW: Final[int] = 1  # block bytes are exactly what wtsString.__str__ renders
+FILTERED: Final[int] = 2  # comment span contains lines which are not comments
+
+_NL = rb'(?:\r\n?|\n)'
+# Mirrors parse_lines: header lines up to the first line starting with '{',
+# content lines up to the first line starting with '}'
+_BlockPattern = re.compile(
+    rb'STRING (?P<id>[^\r\n]*+)' + _NL +
+    rb'(?P<comment>(?:// [^\r\n]*+' + _NL + rb')*+)'
+    rb'(?P<extra>(?>[^{\r\n][^\r\n]*+' + _NL + rb'|' + _NL + rb')*+)'
+    rb'\{(?P<opening>[^\r\n]*+)' + _NL +
+    rb'(?P<content>(?>[^}\r\n][^\r\n]*+' + _NL + rb'|' + _NL + rb')*+)'
+    rb'\}'
+)
+_NotLF = re.compile(rb'\r')
+_NotCRLF = re.compile(rb'\r(?!\n)|(?<!\r)\n')
+
+Block = tuple[int, int, int, int, int, int, int, int]
+
+
+def uniform_newlines(buffer, newline: bytes, /) -> bool:
+    """Return True if all line endings in the buffer are equal to the given newline"""
+    pattern = _NotLF if newline == b'\n' else _NotCRLF
+    return pattern.search(buffer) is None
+
+
+def _header_id(header: bytes, id: int, /) -> int:
+    # STRING lines before the opening brace restart the block, but keep collected comment lines
+    for line in header.splitlines():
+        if line.startswith(b'STRING '):
+            id = int(line.strip()[7:])
+
+    return id
+
+
+def scan_blocks(buffer, /, newline: bytes = None) -> Iterator[Block]:
+    """
+    Scan bytes of a .wts file and yield a tuple for every string block.
+    Tuple consists of string id, block start and end, comment start and end,
+    content start and end, and block flags.
+
+    If newline is specified, blocks rendered by wtsString.__str__ with this newline
+    are flagged as RAW; their end includes the trailing empty line.
+    Caller must ensure that all line endings in the buffer are the same as newline.
+    """
+    search = _BlockPattern.search
+    begin = len(BOM) if buffer[:len(BOM)] == BOM else 0
+    pos = begin
+    while (m := search(buffer, pos)) is not None:
+        start = m.start()
+        if start != begin and buffer[start - 1] not in b'\r\n':
+            pos = start + 1
+            continue
+
+        id_text = m.group(1)
+        id = int(id_text)
+        comment_start, comment_end = m.span(2)
+        header_end = m.end(3)
+        content_start, content_end = m.span(5)
+        end = m.end()
+        flags = 0
+        if header_end != comment_end:
+            id = _header_id(buffer[comment_start:header_end], id)
+            comment_end = header_end
+            flags = FILTERED
+        elif newline is not None and m.end(4) == m.start(4) and id_text == b'%d' % id:
+            trailer = end + 2 * len(newline)
+            if buffer[end:trailer] == newline * 2:
+                end = trailer
+                flags = RAW
+
+        yield id, start, end, comment_start, comment_end, content_start, content_end, flags
+        pos = end
+
+
+def encode(wts: wtsString, /) -> bytes:
+    """Return bytes of the string block as wtsStorage.save writes it"""
+    data = str(wts).encode('utf-8')
+    if NEWLINE != b'\n':
+        data = data.replace(b'\n', NEWLINE)
+
+    return data
+
+
+def file_signature(filepath: str, /) -> tuple[int, int]:
+    stat = os.stat(filepath)
+    return stat.st_size, stat.st_mtime_ns
+
+
+@final
+class FileLayout:
+    """
+    Positions of string blocks in a file which is byte-identical to the one wtsStorage.save writes.
+    Block of string ids[i] occupies bytes from starts[i] to starts[i + 1].
+    """
+    __slots__ = 'path', 'signature', 'ids', 'starts'
+
+    def __init__(self, filepath: str, ids: Iterable[int], starts: Iterable[int], /):
+        self.path = os.path.abspath(filepath)
+        self.signature = file_signature(filepath)
+        self.ids = array('q', ids)
+        self.starts = array('q', starts)
+
+    def matches(self, filepath: str, /) -> bool:
+        """Return True if the file is the one described by this layout and was not changed since"""
+        return (
+                os.path.exists(filepath)
+                and os.path.samefile(filepath, self.path)
+                and file_signature(filepath) == self.signature
+        )
+
+    @classmethod
+    def from_blocks(cls, filepath: str, buffer, blocks: Sequence[Block], /) -> Optional['FileLayout']:
+        """Return the layout of the scanned file or None if wtsStorage.save would write it differently"""
+        if not blocks:
+            return cls(filepath, [], [0]) if len(buffer) == 0 else None
+
+        if buffer[:len(BOM)] != BOM:
+            return None
+
+        ids = array('q')
+        starts = array('q')
+        pos = len(BOM)
+        last_id = -1
+        for id, start, end, *_, flags in blocks:
+            if start != pos or id <= last_id or not flags & RAW:
+                return None
+
+            ids.append(id)
+            starts.append(start)
+            pos = end
+            last_id = id
+
+        if pos != len(buffer):
+            return None
+
+        starts.append(pos)
+        return cls(filepath, ids, starts)
@@ -0,0 +1,128 @@
+from collections.abc import Iterable, Iterator
+from hashlib import blake2b
+from itertools import chain
+from typing import Optional, final
+
+from .string import wtsString
+
+# Values of comment data of a string and its level among strings with the same comment data.
+# Values are used instead of enumerations which hashing is slow
+_Key = tuple[str, str, str, int]
+_Signature = tuple[Optional[_Key], bytes]
+
+
+def _digest(wts: wtsString, /) -> bytes:
+    return blake2b(f'{wts.comment}\0{wts.content}'.encode('utf-8'), digest_size=16).digest()
+
+
+def keyed(strings: Iterable[wtsString], /) -> Iterator[tuple[Optional[_Key], wtsString]]:
+    """
+    Iterate over pairs of key and string; strings without comments have no key.
+    Strings are expected in the storage order, it defines levels of strings with the same comment data.
+    """
+    levels: dict[tuple[str, str, str], int] = {}
+    for wts in strings:
+        data = wts.comment_data
+        if data is None:
+            yield None, wts
+        else:
+            typ, rawcode, field = data
+            values = typ._value_, rawcode, field._value_
+            level = levels[values] = levels.get(values, 0) + 1
+            yield (*values, level), wts
+
+
+def signatures(strings: Iterable[wtsString], /) -> dict[int, _Signature]:
+    """Return keys and digests of texts of strings by their ids"""
+    return {wts.id: (key, _digest(wts)) for key, wts in keyed(strings)}
+
+
+def match(old: dict[int, _Signature], new: dict[int, _Signature], /) -> dict[int, int]:
+    """
+    Return the mapping of ids of old strings to ids of matching new strings.
+    Strings with comments are matched by key; other strings and strings which keys disappeared are matched by id.
+    """
+    old_keys = {key: id for id, (key, _) in old.items() if key is not None}
+    new_keys = {key: id for id, (key, _) in new.items() if key is not None}
+    pairs = {}
+    matched = set()
+    for key, id in new_keys.items():
+        old_id = old_keys.get(key)
+        if old_id is not None:
+            pairs[old_id] = id
+            matched.add(id)
+
+    for id, (key, _) in new.items():
+        if id in matched or id not in old or id in pairs:
+            continue
+
+        if key is None or key not in old_keys:
+            old_key = old[id][0]
+            if old_key is None or old_key not in new_keys:
+                pairs[id] = id
+
+    return pairs
+
+
+def _describe(key: Optional[_Key], /) -> str:
+    if key is None:
+        return ''
+
+    typ, rawcode, field, level = key
+    return f' {typ}: {rawcode}, {field} {level}'
+
+
+@final
+class wtsDiff:
+    """
+    Difference between two storages.
+    Added and removed are ids of new and old strings without a match;
+    changed and moved are pairs of old and new ids of matched strings which texts or ids differ.
+    """
+    __slots__ = 'added', 'removed', 'changed', 'moved', '_keys'
+
+    def __init__(self, old: dict[int, _Signature], new: dict[int, _Signature], /):
+        pairs = match(old, new)
+        matched = set(pairs.values())
+        self.added: list[int] = sorted(id for id in new if id not in matched)
+        self.removed: list[int] = sorted(id for id in old if id not in pairs)
+        self.changed: list[tuple[int, int]] = []
+        self.moved: list[tuple[int, int]] = []
+        for old_id, new_id in sorted(pairs.items(), key=lambda pair: pair[1]):
+            if old[old_id][1] != new[new_id][1]:
+                self.changed.append((old_id, new_id))
+            if old_id != new_id:
+                self.moved.append((old_id, new_id))
+
+        # Keys of reported strings
+        self._keys = {('-', id): old[id][0] for id in self.removed}
+        self._keys.update((('+', id), new[id][0]) for id in self.added)
+        self._keys.update((('+', id), new[id][0]) for _, id in chain(self.changed, self.moved))
+
+    def __bool__(self, /) -> bool:
+        return bool(self.added or self.removed or self.changed or self.moved)
+
+    def report(self, /) -> Iterator[str]:
+        """
+        Iterate over lines of a compact report: '- id' for removed strings, '+ id' for added,
+        '~ id' for changed, '> old new' for moved. Lines of strings with comments end with their keys.
+        """
+        keys = self._keys
+        for id in self.removed:
+            yield f'- {id}{_describe(keys["-", id])}\n'
+        for id in self.added:
+            yield f'+ {id}{_describe(keys["+", id])}\n'
+        for _, id in self.changed:
+            yield f'~ {id}{_describe(keys["+", id])}\n'
+        for old_id, id in self.moved:
+            yield f'> {old_id} {id}{_describe(keys["+", id])}\n'
+
+    def __repr__(self, /) -> str:
+        return (
+            f'{self.__class__.__name__}('
+            f'added={len(self.added)}, '
+            f'removed={len(self.removed)}, '
+            f'changed={len(self.changed)}, '
+            f'moved={len(self.moved)}'
+            f')'
+        )
@@ -0,0 +1,179 @@
+from collections.abc import Iterable, Iterator
+from heapq import heapify, heappop, heappush, heapreplace
+from typing import final
+
+
+@final
+class IdAllocator:
+    """
+    Set of free string ids stored as intervals.
+    All ids starting from the tail id are free; ids below it are free only within gaps.
+    Allocate returns the smallest free id, reserve takes consecutive ids from the largest gap if it fits.
+    All operations take logarithmic time. Id 0 is never allocated.
+    """
+    __slots__ = '_gaps', '_ends', '_used', '_lowest', '_largest', '_tail'
+
+    def __init__(self, used: Iterable[int] = (), /):
+        # Gap covers ids from its start to its end exclusively
+        self._gaps: dict[int, int] = {}  # start -> end
+        self._ends: dict[int, int] = {}  # end -> start
+        # Taken ids below the tail
+        self._used: set[int] = set(used)
+        # Heaps may contain outdated entries which are skipped or corrected when they reach the top.
+        # Starts of gaps
+        self._lowest: list[int] = []
+        # Negated sizes and ends of gaps, a size may be greater than the actual one
+        self._largest: list[tuple[int, int]] = []
+        last = 0
+        for id in sorted(self._used):
+            if id > last + 1:
+                self._gaps[last + 1] = id
+                self._ends[id] = last + 1
+
+            last = id
+
+        self._tail = last + 1
+        self._rebuild()
+
+    @classmethod
+    def from_gaps(cls, gaps: Iterable[tuple[int, int]], tail: int, /) -> 'IdAllocator':
+        """Create an allocator from free intervals and the tail id as returned by gaps and tail"""
+        self = cls()
+        used = self._used
+        last = 1
+        for start, end in gaps:
+            used.update(range(last, start))
+            self._gaps[start] = end
+            self._ends[end] = start
+            last = end
+
+        used.update(range(last, tail))
+        self._tail = tail
+        self._rebuild()
+        return self
+
+    def _rebuild(self, /):
+        self._lowest = list(self._gaps)
+        heapify(self._lowest)
+        self._largest = [(start - end, end) for start, end in self._gaps.items()]
+        heapify(self._largest)
+
+    def _compact(self, /):
+        # Heaps are rebuilt when outdated entries make them much larger than the number of gaps
+        limit = 2 * len(self._gaps) + 32
+        if len(self._lowest) > limit or len(self._largest) > limit:
+            self._rebuild()
+
+    @property
+    def tail(self, /) -> int:
+        return self._tail
+
+    def gaps(self, /) -> Iterator[tuple[int, int]]:
+        """Iterate over free intervals below the tail id as pairs of the first and after the last ids"""
+        return iter(sorted(self._gaps.items()))
+
+    def __contains__(self, id: int, /) -> bool:
+        return id > 0 and (id >= self._tail or id not in self._used)
+
+    def allocate(self, /) -> int:
+        gaps = self._gaps
+        lowest = self._lowest
+        while lowest and lowest[0] not in gaps:
+            heappop(lowest)
+
+        if not lowest:
+            id = self._tail
+            self._tail += 1
+        else:
+            id = lowest[0]
+            end = gaps.pop(id)
+            if id + 1 == end:
+                del self._ends[end]
+                heappop(lowest)
+            else:
+                gaps[id + 1] = end
+                self._ends[end] = id + 1
+                heapreplace(lowest, id + 1)
+
+        self._used.add(id)
+        return id
+
+    def reserve(self, count: int, /) -> range:
+        """Allocate an interval of the given number of consecutive ids"""
+        if count <= 0:
+            raise ValueError(f'count must be positive, got {count}')
+
+        ends = self._ends
+        largest = self._largest
+        while largest:
+            size, end = largest[0]
+            start = ends.get(end)
+            if start is None:
+                heappop(largest)
+            elif start - end != size:
+                heapreplace(largest, (start - end, end))
+            else:
+                break
+
+        if largest and -largest[0][0] >= count:
+            end = largest[0][1]
+            start = ends[end]
+            stop = start + count
+            del self._gaps[start]
+            if stop == end:
+                del ends[end]
+                heappop(largest)
+            else:
+                self._gaps[stop] = end
+                ends[end] = stop
+                heappush(self._lowest, stop)
+                self._compact()
+        else:
+            start = self._tail
+            stop = self._tail = start + count
+
+        self._used.update(range(start, stop))
+        return range(start, stop)
+
+    def release(self, id: int, /):
+        if id <= 0:
+            raise ValueError(f'id must be positive, got {id}')
+
+        if id >= self._tail or id not in self._used:
+            raise ValueError(f'id {id} is already free')
+
+        self._used.remove(id)
+        gaps = self._gaps
+        ends = self._ends
+        # Gaps to the left and to the right of id are merged with it
+        start = ends.pop(id, None)
+        if start is None:
+            start = id
+        else:
+            del gaps[start]
+
+        end = gaps.pop(id + 1, None)
+        if end is None:
+            end = id + 1
+        else:
+            del ends[end]
+
+        if end == self._tail:
+            self._tail = start
+            return
+
+        gaps[start] = end
+        ends[end] = start
+        if start == id:
+            heappush(self._lowest, start)
+        heappush(self._largest, (start - end, end))
+        self._compact()
+
+    def clear(self, /):
+        """Make all ids free"""
+        self._gaps.clear()
+        self._ends.clear()
+        self._used.clear()
+        self._lowest.clear()
+        self._largest.clear()
+        self._tail = 1
@@ -0,0 +1,97 @@
+from collections.abc import Iterable
+from itertools import chain
+from typing import NamedTuple, Optional, Union
+
+from .diff import keyed
+from .ids import IdAllocator
+from .string import wtsString
+
+# Strings with comments are aligned by values of comment data and level, other strings by id
+_Key = Union[tuple[str, str, str, int], int]
+
+
+class wtsConflict(NamedTuple):
+    """Versions of a string changed differently in both storages; a missing version means the string is deleted"""
+    # Id of the string in the merged storage
+    id: int
+    base: Optional[wtsString]
+    ours: Optional[wtsString]
+    theirs: Optional[wtsString]
+
+
+def _aligned(strings: Iterable[wtsString], /) -> dict[_Key, wtsString]:
+    return {wts.id if key is None else key: wts for key, wts in keyed(strings)}
+
+
+def merge(
+        base: Iterable[wtsString],
+        ours: Iterable[wtsString],
+        theirs: Iterable[wtsString],
+        /,
+) -> tuple[list[wtsString], list[wtsConflict]]:
+    """
+    Merge changes of our and their strings since the base ones.
+    Return merged strings sorted by id and conflicts; a conflicting string is taken from ours if it is not deleted.
+    Merged strings keep their ids if possible since map files refer to them; ids of theirs take precedence.
+    Different strings without comments added to both with the same id are separate additions;
+    ours gets an id after all ids of the three versions, so no reference to another string points to it.
+    """
+    base = _aligned(base)
+    ours = _aligned(ours)
+    theirs = _aligned(theirs)
+    # Pairs of the merged version and whether it conflicts by key
+    merged: dict[_Key, tuple[wtsString, bool]] = {}
+    # Our strings added alongside theirs with the same id
+    added: list[wtsString] = []
+    for key in {**theirs, **ours}:
+        b = base.get(key)
+        o = ours.get(key)
+        t = theirs.get(key)
+        b_text = None if b is None else (b._comment, b._content)
+        o_text = None if o is None else (o._comment, o._content)
+        t_text = None if t is None else (t._comment, t._content)
+        if o_text == t_text or t_text == b_text:
+            wts, conflict = o, False
+        elif o_text == b_text:
+            wts, conflict = t, False
+        elif b is None and type(key) is int:
+            wts, conflict = t, False
+            added.append(o)
+        else:
+            wts, conflict = o or t, True
+
+        if wts is not None:
+            merged[key] = wts, conflict
+
+    # Assign ids: their ids, then our ids which are not taken, then free ids
+    ids: dict[_Key, int] = {key: theirs[key].id for key in merged if key in theirs}
+    taken = set(ids.values())
+    for key in merged:
+        if key not in ids and (id := ours[key].id) not in taken:
+            ids[key] = id
+            taken.add(id)
+
+    allocator = IdAllocator(taken)
+    for key in merged:
+        if key not in ids:
+            ids[key] = allocator.allocate()
+
+    strings = []
+    last = max((wts.id for wts in chain(base.values(), ours.values(), theirs.values())), default=0)
+    for id, wts in enumerate(added, max(last, max(ids.values(), default=0)) + 1):
+        copy = wtsString(id, wts.content, wts.comment)
+        copy._comment_data = wts.comment_data
+        strings.append(copy)
+
+    conflicts = []
+    for key, (wts, conflict) in merged.items():
+        id = ids[key]
+        copy = wtsString(id, wts.content, wts.comment)
+        copy._comment_data = wts.comment_data
+        strings.append(copy)
+        if conflict:
+            conflicts.append(wtsConflict(id, base.get(key), ours.get(key), theirs.get(key)))
+
+    strings.sort()
+    conflicts.sort(key=lambda conflict: conflict.id)
+    return strings, conflicts
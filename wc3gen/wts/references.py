@@ -0,0 +1,148 @@
+import re
+from collections.abc import Iterable, Mapping
+from mmap import ACCESS_READ, ACCESS_WRITE, mmap
+from typing import Final, Union
+
+from ..mpq import MPQArchive, replace_file
+
+_TrigstrPattern = re.compile(rb'TRIGSTR_(\d+)')
+
+# Map files which can refer to strings of war3map.wts
+map_files: Final[tuple[str, ...]] = (
+    'war3map.j',
+    'scripts\\war3map.j',
+    'war3map.lua',
+    'war3map.w3i',
+    'war3map.w3u',
+    'war3map.w3t',
+    'war3map.w3b',
+    'war3map.w3d',
+    'war3map.w3a',
+    'war3map.w3h',
+    'war3map.w3q',
+    'war3map.wtg',
+    'war3map.wct',
+    'war3map.w3c',
+    'war3map.w3r',
+    'war3map.w3s',
+    'war3mapMisc.txt',
+    'war3mapSkin.txt',
+    'war3mapExtra.txt',
+)
+
+
+def scan_references(data, /) -> set[int]:
+    """Return ids of strings referred as TRIGSTR_NNN in bytes of a file"""
+    return set(map(int, _TrigstrPattern.findall(data)))
+
+
+def scan_files(filepaths: Iterable[str], /) -> set[int]:
+    """Return ids of strings referred in any of the files"""
+    ids = set()
+    for filepath in filepaths:
+        with open(filepath, 'rb') as f:
+            try:
+                buffer = mmap(f.fileno(), 0, access=ACCESS_READ)
+            except ValueError:
+                # Empty files cannot be mapped
+                continue
+
+        with buffer:
+            ids |= scan_references(buffer)
+
+    return ids
+
+
+def map_references(archive: Union[str, MPQArchive], /) -> set[int]:
+    """Return ids of strings referred in files of a map archive which can refer to strings"""
+    if isinstance(archive, str):
+        with MPQArchive(archive) as archive:
+            return map_references(archive)
+
+    ids = set()
+    for name in map_files:
+        if name in archive:
+            ids |= scan_references(archive.read(name))
+
+    return ids
+
+
+def _replacements(data, mapping: Mapping[int, int], /) -> list[tuple[int, bytes]]:
+    # Return positions and new digits of references which ids are in the mapping.
+    # References keep their length, so files with length-prefixed strings remain valid
+    replacements = []
+    for match in _TrigstrPattern.finditer(data):
+        digits = match.group(1)
+        new = mapping.get(int(digits))
+        if new is not None:
+            new_digits = b'%0*d' % (len(digits), new)
+            if len(new_digits) != len(digits):
+                raise ValueError(f'cannot replace reference {match.group().decode()} to string {new}, '
+                                 f'new id must not have more digits than the old one')
+
+            replacements.append((match.start(1), new_digits))
+
+    return replacements
+
+
+def rewrite_references(data: bytes, mapping: Mapping[int, int], /) -> bytes:
+    """
+    Return bytes of a file with references to strings replaced according to the mapping of old ids to new ones.
+    New ids are padded with zeros to the width of old ones.
+    """
+    replacements = _replacements(data, mapping)
+    if not replacements:
+        return data
+
+    data = bytearray(data)
+    for pos, digits in replacements:
+        data[pos:pos + len(digits)] = digits
+
+    return bytes(data)
+
+
+def rewrite_files(filepaths: Iterable[str], mapping: Mapping[int, int], /) -> int:
+    """
+    Replace references to strings in the files in place according to the mapping of old ids to new ones.
+    Return the number of replaced references.
+    """
+    count = 0
+    for filepath in filepaths:
+        with open(filepath, 'r+b') as f:
+            try:
+                buffer = mmap(f.fileno(), 0, access=ACCESS_WRITE)
+            except ValueError:
+                # Empty files cannot be mapped
+                continue
+
+        with buffer:
+            replacements = _replacements(buffer, mapping)
+            for pos, digits in replacements:
+                buffer[pos:pos + len(digits)] = digits
+
+            count += len(replacements)
+
+    return count
+
+
+def rewrite_map_references(filepath: str, mapping: Mapping[int, int], /) -> int:
+    """
+    Replace references to strings in files of a map archive which can refer to strings
+    according to the mapping of old ids to new ones. Return the number of replaced references.
+    Only changed files are written into the archive.
+    """
+    changed = {}
+    count = 0
+    with MPQArchive(filepath) as archive:
+        for name in map_files:
+            if name in archive:
+                data = archive.read(name)
+                replacements = _replacements(data, mapping)
+                if replacements:
+                    changed[name] = rewrite_references(data, mapping)
+                    count += len(replacements)
+
+    for name, data in changed.items():
+        replace_file(filepath, name, data)
+
+    return count
@@ -0,0 +1,95 @@
+import hashlib
+import struct
+import sys
+from array import array
+from collections.abc import Iterable
+from itertools import accumulate, chain
+from typing import Final, Union
+
+MAGIC: Final[bytes] = b'WTSS'
+VERSION: Final[int] = 1
+
+_Header = struct.Struct('<4sHH')
+_SectionHeader = struct.Struct('<B2sQ')
+
+Section = Union[array, bytes]
+
+
+def file_hash(filepath: str, /) -> bytes:
+    """Return SHA-256 digest of the file"""
+    with open(filepath, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').digest()
+
+
+def write_snapshot(filepath: str, sections: dict[str, Section], /):
+    """
+    Write named arrays and byte strings into a snapshot file.
+    Every section is stored as its name, array typecode and little-endian data.
+    """
+    with open(filepath, 'wb') as f:
+        f.write(_Header.pack(MAGIC, VERSION, len(sections)))
+        for name, data in sections.items():
+            if isinstance(data, array):
+                typecode = data.typecode
+                if sys.byteorder == 'big' and data.itemsize > 1:
+                    data = array(typecode, data)
+                    data.byteswap()
+
+                data = data.tobytes()
+            else:
+                typecode = ''
+
+            name = name.encode('ascii')
+            f.write(_SectionHeader.pack(len(name), typecode.encode('ascii').ljust(2), len(data)))
+            f.write(name)
+            f.write(data)
+
+
+def read_snapshot(filepath: str, /) -> dict[str, Section]:
+    """Read sections of a snapshot file written by write_snapshot"""
+    with open(filepath, 'rb') as f:
+        data = f.read()
+
+    if len(data) < _Header.size:
+        raise ValueError(f'file {filepath!r} is not a snapshot')
+
+    magic, version, count = _Header.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f'file {filepath!r} is not a snapshot')
+    if version != VERSION:
+        raise ValueError(f'snapshot {filepath!r} has version {version}, expected {VERSION}')
+
+    view = memoryview(data)
+    pos = _Header.size
+    sections = {}
+    for _ in range(count):
+        name_length, typecode, length = _SectionHeader.unpack_from(data, pos)
+        pos += _SectionHeader.size
+        name = data[pos:pos + name_length].decode('ascii')
+        pos += name_length
+        typecode = typecode.rstrip().decode('ascii')
+        if typecode:
+            section = array(typecode)
+            section.frombytes(view[pos:pos + length])
+            if sys.byteorder == 'big' and section.itemsize > 1:
+                section.byteswap()
+        else:
+            section = data[pos:pos + length]
+
+        sections[name] = section
+        pos += length
+
+    return sections
+
+
+def pack_texts(texts: Iterable[str], /) -> tuple[bytes, array]:
+    """Join texts into UTF-8 bytes and return them with character offsets of text ends"""
+    texts = list(texts)
+    ends = array('Q', accumulate(map(len, texts)))
+    return ''.join(texts).encode('utf-8'), ends
+
+
+def unpack_texts(data: bytes, ends: array, /) -> list[str]:
+    """Split bytes returned by pack_texts back into texts"""
+    text = data.decode('utf-8')
+    return [text[start:end] for start, end in zip(chain((0,), ends), ends)]
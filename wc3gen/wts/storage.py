@@ -1,8 +1,32 @@
-from collections.abc import Iterable, Iterator
-from io import StringIO
-from typing import Final, Optional, Union, final
+import os
+import re
+import shutil
+from array import array
+from bisect import bisect_left
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from functools import wraps
+from heapq import merge as merge_sorted
+from io import BytesIO, StringIO
+from itertools import chain, count, islice, repeat
+from mmap import ACCESS_READ, mmap
+from tempfile import TemporaryDirectory, mkstemp
+from threading import RLock
+from sys import intern
+from typing import BinaryIO, Final, Optional, Union, final
+from weakref import WeakSet
 
-from .string import _CommentData, wtsCommentField, wtsCommentType, wtsString
+from misclib.functions import repr_collection
+from ..mpq import MPQArchive, compact_archive, replace_file
+from .blocks import (
+    BOM, Block, FILTERED, FileLayout, NEWLINE, RAW, encode, file_signature, scan_blocks, uniform_newlines,
+)
+from .diff import signatures, wtsDiff
+from .ids import IdAllocator
+from .merge import merge, wtsConflict
+from .snapshot import file_hash, pack_texts, read_snapshot, unpack_texts, write_snapshot
+from .string import _CommentData, _fields, _types, parse_comment, wtsCommentField, wtsCommentType, wtsString
 
 
 @final
@@ -12,10 +36,39 @@ class wtsStorageError(Exception):
 
 @final
 class _CommentMap:
-    __slots__ = '_map',
+    """
+    Index of strings by their comment data.
+    Also indexes strings by rawcode and by comment type; ids in every record keep the order of addition.
+    """
+    __slots__ = '_map', '_rawcodes', '_types'
 
-    def __init__(self, /):
-        self._map: dict[_CommentData, list[wtsString]] = {}
+    def __init__(self, items: Iterable[tuple[int, Optional[_CommentData]]] = (), /):
+        map_: dict[_CommentData, list[int]] = {}
+        rawcodes: dict[str, dict[int, None]] = {}
+        types: dict[wtsCommentType, dict[int, None]] = {}
+        get = map_.get
+        for id, data in items:
+            if data:
+                ids = get(data)
+                if ids is None:
+                    map_[data] = [id]
+                else:
+                    ids.append(id)
+
+                typ, rawcode, _ = data
+                if rawcode in rawcodes:
+                    rawcodes[rawcode][id] = None
+                else:
+                    rawcodes[rawcode] = {id: None}
+
+                if typ in types:
+                    types[typ][id] = None
+                else:
+                    types[typ] = {id: None}
+
+        self._map = map_
+        self._rawcodes = rawcodes
+        self._types = types
 
     def __len__(self, /) -> int:
         return len(self._map)
@@ -26,44 +79,498 @@ class _CommentMap:
     def __iter__(self, /) -> Iterator[_CommentData]:
         return iter(self._map)
 
-    def __getitem__(self, item: _CommentData, /) -> Optional[list[wtsString]]:
+    def __getitem__(self, item: _CommentData, /) -> Optional[list[int]]:
         return self._map.get(item)
 
-    def add(self, wts: wtsString, /) -> bool:
-        data = wts.comment_data
+    def of_rawcode(self, rawcode: str, /) -> Iterable[int]:
+        return self._rawcodes.get(rawcode, ())
+
+    def of_type(self, typ: wtsCommentType, /) -> Iterable[int]:
+        return self._types.get(typ, ())
+
+    def add(self, id: int, data: Optional[_CommentData], /) -> bool:
         if data:
             if data in self._map:
-                self._map[data].append(wts)
+                self._map[data].append(id)
             else:
-                self._map[data] = [wts]
+                self._map[data] = [id]
 
+            typ, rawcode, _ = data
+            self._rawcodes.setdefault(rawcode, {})[id] = None
+            self._types.setdefault(typ, {})[id] = None
             return True
 
         return False
 
-    def remove(self, wts: wtsString, /) -> bool:
-        data = wts.comment_data
+    def remove(self, id: int, data: Optional[_CommentData], /) -> bool:
         if data:
             record = self._map.get(data)
             if record is None:
-                raise wtsStorageError(f'cannot remove comment data for {wts!r}, '
+                raise wtsStorageError(f'cannot remove comment data for string {id}, '
                                       f'its data is not present in the comment map')
 
             try:
-                record.remove(wts)
+                record.remove(id)
             except ValueError:
-                raise wtsStorageError(f'cannot remove comment data for {wts!r}, '
+                raise wtsStorageError(f'cannot remove comment data for string {id}, '
                                       f'its is not present in the comment map') from None
 
             if len(record) == 0:
                 del self._map[data]
 
+            typ, rawcode, _ = data
+            for index, key in (self._rawcodes, rawcode), (self._types, typ):
+                ids = index[key]
+                del ids[id]
+                if len(ids) == 0:
+                    del index[key]
+
             return True
 
         return False
 
     def clear(self, /):
         self._map.clear()
+        self._rawcodes.clear()
+        self._types.clear()
+
+
+@final
+class _ContentIndex:
+    """Trigram index of string contents for substring search"""
+    __slots__ = '_trigrams',
+
+    def __init__(self, items: Iterable[tuple[int, str]] = (), /):
+        self._trigrams: dict[str, set[int]] = {}
+        for id, content in items:
+            self.add(id, content)
+
+    @staticmethod
+    def _split(text: str, /) -> set[str]:
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def add(self, id: int, content: str, /):
+        trigrams = self._trigrams
+        for trigram in self._split(content):
+            if trigram in trigrams:
+                trigrams[trigram].add(id)
+            else:
+                trigrams[trigram] = {id}
+
+    def remove(self, id: int, content: str, /):
+        trigrams = self._trigrams
+        for trigram in self._split(content):
+            ids = trigrams[trigram]
+            ids.discard(id)
+            if len(ids) == 0:
+                del trigrams[trigram]
+
+    def candidates(self, text: str, /) -> Optional[set[int]]:
+        """
+        Return ids of strings which content may contain the text.
+        Return None if the text is too short to be searched by trigrams.
+        """
+        if len(text) < 3:
+            return None
+
+        records = []
+        for trigram in self._split(text):
+            ids = self._trigrams.get(trigram)
+            if ids is None:
+                return set()
+
+            records.append(ids)
+
+        records.sort(key=len)
+        return records[0].intersection(*records[1:])
+
+    def clear(self, /):
+        self._trigrams.clear()
+
+
+@final
+class _MappedStrings:
+    """
+    Dictionary-like table of strings backed by a memory-mapped .wts file.
+    Only offsets of string blocks are stored after opening;
+    a block is decoded into wtsString on first access.
+    """
+    __slots__ = '_storage', '_path', '_buffer', '_crlf', '_blocks', '_entries', 'layout'
+
+    def __init__(self, storage: 'wtsStorage', filepath: str, /):
+        self._storage = storage
+        self._entries: dict[int, Union[int, wtsString]] = {}
+        for row, (id, *block) in enumerate(self._map(filepath)):
+            if id in self._entries:
+                raise wtsStorageError(f'id repeated: {self[id]!r} and {self._decode(id, row)!r}')
+
+            self._entries[id] = row
+
+    def _map(self, filepath: str, /) -> list[Block]:
+        with open(filepath, 'rb') as f:
+            try:
+                buffer = mmap(f.fileno(), 0, access=ACCESS_READ)
+            except ValueError:
+                # Empty files cannot be mapped
+                buffer = b''
+
+        newline = NEWLINE if uniform_newlines(buffer, NEWLINE) else None
+        blocks = list(scan_blocks(buffer, newline))
+        self._path = filepath
+        self._buffer = buffer
+        self._crlf = buffer.find(b'\r') != -1
+        self._blocks = array('q', chain.from_iterable(block[1:] for block in blocks))
+        self.layout = FileLayout.from_blocks(filepath, buffer, blocks)
+        return blocks
+
+    def maps(self, filepath: str, /) -> bool:
+        return os.path.exists(filepath) and os.path.samefile(filepath, self._path)
+
+    def close(self, /):
+        if isinstance(self._buffer, mmap):
+            self._buffer.close()
+
+    def remap(self, /):
+        """Map the file again after it is rewritten with all strings of this table"""
+        self.close()
+        entries = self._entries
+        for row, (id, *_) in enumerate(self._map(self._path)):
+            if type(entries[id]) is int:
+                entries[id] = row
+
+    def _text(self, start: int, end: int, /) -> str:
+        text = self._buffer[start:end].decode('utf-8')
+        if self._crlf:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+
+        return text
+
+    def _comment(self, row: int, /) -> str:
+        _, _, start, end, _, _, flags = self._blocks[row * 7:row * 7 + 7]
+        comment = self._text(start, end)
+        if flags & FILTERED:
+            comment = ''.join(line for line in comment.splitlines(True) if line.startswith('// '))
+
+        return comment
+
+    def _decode(self, id: int, row: int, /) -> wtsString:
+        start, end = self._blocks[row * 7 + 4:row * 7 + 6]
+        return wtsString(id, self._text(start, end), self._comment(row))
+
+    def _load(self, id: int, row: int, /) -> wtsString:
+        wts = self._entries[id] = self._decode(id, row)
+        wts._storage = self._storage
+        return wts
+
+    def __len__(self, /) -> int:
+        return len(self._entries)
+
+    def __contains__(self, id: int, /) -> bool:
+        return id in self._entries
+
+    def __iter__(self, /) -> Iterator[int]:
+        return iter(self._entries)
+
+    def keys(self, /):
+        return self._entries.keys()
+
+    def values(self, /) -> Iterator[wtsString]:
+        for id, entry in self._entries.items():
+            if type(entry) is int:
+                entry = self._load(id, entry)
+
+            yield entry
+
+    def loaded(self, /) -> Iterator[wtsString]:
+        """Iterate over already decoded strings"""
+        return (entry for entry in self._entries.values() if type(entry) is not int)
+
+    def transient(self, /) -> Iterator[wtsString]:
+        """Iterate over strings; strings which are not decoded yet are decoded without being kept"""
+        for id, entry in self._entries.items():
+            yield self._decode(id, entry) if type(entry) is int else entry
+
+    def __getitem__(self, id: int, /) -> wtsString:
+        entry = self._entries[id]
+        if type(entry) is int:
+            entry = self._load(id, entry)
+
+        return entry
+
+    def get(self, id: int, default=None, /):
+        if id in self._entries:
+            return self[id]
+
+        return default
+
+    def __setitem__(self, id: int, wts: wtsString, /):
+        self._entries[id] = wts
+
+    def pop(self, id: int, /) -> wtsString:
+        wts = self[id]
+        del self._entries[id]
+        return wts
+
+    def clear(self, /):
+        self._entries.clear()
+
+    def comment_data(self, id: int, /) -> Optional[_CommentData]:
+        entry = self._entries[id]
+        if type(entry) is int:
+            return parse_comment(self._comment(entry))
+
+        return entry.comment_data
+
+    def encoded(self, id: int, /) -> bytes:
+        """Return bytes of the string block as wtsStorage.save writes it"""
+        entry = self._entries[id]
+        if type(entry) is int:
+            start, end = self._blocks[entry * 7:entry * 7 + 2]
+            if self._blocks[entry * 7 + 6] & RAW:
+                return self._buffer[start:end]
+
+            entry = self._decode(id, entry)
+
+        return encode(entry)
+
+
+_CompactCommentPattern = re.compile(r'// ([^:]+): (.{4}) \((.*)\), (\S+) \(([^()]*)\)\n')
+_comment_types: Final[tuple[wtsCommentType, ...]] = tuple(wtsCommentType)
+_comment_fields: Final[tuple[wtsCommentField, ...]] = tuple(wtsCommentField)
+_comment_type_indexes: Final[dict[str, int]] = {t.value: i for i, t in enumerate(_comment_types)}
+_comment_field_indexes: Final[dict[str, int]] = {f.value: i for i, f in enumerate(_comment_fields)}
+
+
+@final
+class _CompactStrings:
+    """
+    Dictionary-like table of strings which keeps opened strings in arrays.
+    Contents are stored in one UTF-8 buffer addressed by offsets.
+    Comments are stored as comment data packed into an integer plus indexes of object name and field label.
+    A string is converted into wtsString on first access; such strings and added ones are kept as objects.
+    """
+    __slots__ = (
+        '_storage', '_ids', '_sorted_ids', '_sorted_rows', '_alive', '_alive_count',
+        '_contents', '_offsets', '_keys', '_names', '_labels', '_name_table', '_label_table', '_other_comments',
+        '_loaded', '_added', 'layout',
+    )
+
+    def __init__(self, storage: 'wtsStorage', filepath: str, /):
+        self._storage = storage
+        with open(filepath, 'rb') as f:
+            data = f.read()
+
+        newline = NEWLINE if uniform_newlines(data, NEWLINE) else None
+        blocks = list(scan_blocks(data, newline))
+        self.layout = FileLayout.from_blocks(filepath, data, blocks)
+
+        crlf = b'\r' in data
+        self._ids = ids = array('q')
+        self._contents = contents = bytearray()
+        self._offsets = offsets = array('Q', [0])
+        self._keys = keys = array('Q')
+        self._names = names = array('I')
+        self._labels = labels = array('I')
+        self._other_comments: dict[int, str] = {}
+        name_indexes: dict[str, int] = {}
+        label_indexes: dict[str, int] = {}
+        for row, (id, _, _, comment_start, comment_end, content_start, content_end, flags) in enumerate(blocks):
+            ids.append(id)
+            content = data[content_start:content_end]
+            if crlf:
+                content = content.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+
+            contents += content
+            offsets.append(len(contents))
+
+            comment = data[comment_start:comment_end].decode('utf-8')
+            if crlf:
+                comment = comment.replace('\r\n', '\n').replace('\r', '\n')
+            if flags & FILTERED:
+                comment = ''.join(line for line in comment.splitlines(True) if line.startswith('// '))
+
+            key, name, label = self._pack_comment(comment)
+            keys.append(key)
+            names.append(name_indexes.setdefault(name, len(name_indexes)))
+            labels.append(label_indexes.setdefault(label, len(label_indexes)))
+            if key == 0 and comment:
+                self._other_comments[row] = comment
+
+        self._name_table = list(name_indexes)
+        self._label_table = list(label_indexes)
+        order = sorted(range(len(ids)), key=ids.__getitem__)
+        self._sorted_ids = array('q', (ids[row] for row in order))
+        self._sorted_rows = array('Q', order)
+        self._alive = bytearray(b'\1') * len(ids)
+        self._alive_count = len(ids)
+        self._loaded: dict[int, wtsString] = {}
+        self._added: dict[int, wtsString] = {}
+
+        sorted_ids = self._sorted_ids
+        for i in range(1, len(sorted_ids)):
+            if sorted_ids[i - 1] == sorted_ids[i]:
+                id = sorted_ids[i]
+                first, second = [row for row in range(len(ids)) if ids[row] == id][:2]
+                raise wtsStorageError(f'id repeated: {self._decode(id, first)!r} and {self._decode(id, second)!r}')
+
+    @staticmethod
+    def _pack_comment(comment: str, /) -> tuple[int, str, str]:
+        # Return 0 as packed comment data if the comment cannot be restored from it
+        match = _CompactCommentPattern.fullmatch(comment)
+        if match is None:
+            return 0, '', ''
+
+        typ, rawcode, name, field, label = match.groups()
+        typ = _comment_type_indexes.get(typ)
+        field = _comment_field_indexes.get(field)
+        if typ is None or field is None or not rawcode.isascii() or '\n' in name:
+            return 0, '', ''
+
+        key = int.from_bytes(rawcode.encode('ascii'), 'big') << 16 | field << 8 | typ + 1
+        return key, intern(name), intern(label)
+
+    def _comment_data(self, row: int, /) -> Optional[_CommentData]:
+        key = self._keys[row]
+        if key == 0:
+            return parse_comment(self._other_comments.get(row, ''))
+
+        rawcode = intern((key >> 16).to_bytes(4, 'big').decode('ascii'))
+        return _comment_types[(key & 0xFF) - 1], rawcode, _comment_fields[(key >> 8) & 0xFF]
+
+    def _comment(self, row: int, /) -> str:
+        key = self._keys[row]
+        if key == 0:
+            return self._other_comments.get(row, '')
+
+        typ, rawcode, field = self._comment_data(row)
+        name = self._name_table[self._names[row]]
+        label = self._label_table[self._labels[row]]
+        return f'// {typ.value}: {rawcode} ({name}), {field.value} ({label})\n'
+
+    def _content(self, row: int, /) -> str:
+        return self._contents[self._offsets[row]:self._offsets[row + 1]].decode('utf-8')
+
+    def _decode(self, id: int, row: int, /) -> wtsString:
+        wts = wtsString(id, self._content(row), self._comment(row))
+        wts._comment_data = self._comment_data(row)
+        return wts
+
+    def _row(self, id: int, /) -> int:
+        # Return the row of an opened string which is not deleted, otherwise -1
+        sorted_ids = self._sorted_ids
+        i = bisect_left(sorted_ids, id)
+        if i < len(sorted_ids) and sorted_ids[i] == id:
+            row = self._sorted_rows[i]
+            if self._alive[row]:
+                return row
+
+        return -1
+
+    def __len__(self, /) -> int:
+        return self._alive_count + len(self._added)
+
+    def __contains__(self, id: int, /) -> bool:
+        return id in self._added or self._row(id) != -1
+
+    def __iter__(self, /) -> Iterator[int]:
+        ids = self._ids
+        alive = self._alive
+        for row in range(len(ids)):
+            if alive[row]:
+                yield ids[row]
+
+        yield from self._added
+
+    def keys(self, /) -> Iterator[int]:
+        return iter(self)
+
+    def values(self, /) -> Iterator[wtsString]:
+        for id in self:
+            yield self[id]
+
+    def loaded(self, /) -> Iterator[wtsString]:
+        """Iterate over strings which are kept as objects"""
+        return chain(self._loaded.values(), self._added.values())
+
+    def transient(self, /) -> Iterator[wtsString]:
+        """Iterate over strings; strings which are not kept as objects are decoded without being kept"""
+        ids = self._ids
+        alive = self._alive
+        loaded = self._loaded
+        for row in range(len(ids)):
+            if alive[row]:
+                id = ids[row]
+                wts = loaded.get(id)
+                yield self._decode(id, row) if wts is None else wts
+
+        yield from self._added.values()
+
+    def contents(self, /) -> Iterator[tuple[int, str]]:
+        """Iterate over pairs of id and content without creating strings"""
+        ids = self._ids
+        alive = self._alive
+        loaded = self._loaded
+        for row in range(len(ids)):
+            if alive[row]:
+                id = ids[row]
+                wts = loaded.get(id)
+                yield id, self._content(row) if wts is None else wts.content
+
+        for id, wts in self._added.items():
+            yield id, wts.content
+
+    def __getitem__(self, id: int, /) -> wtsString:
+        wts = self._added.get(id) or self._loaded.get(id)
+        if wts is not None:
+            return wts
+
+        row = self._row(id)
+        if row == -1:
+            raise KeyError(id)
+
+        wts = self._loaded[id] = self._decode(id, row)
+        wts._storage = self._storage
+        return wts
+
+    def get(self, id: int, default=None, /):
+        if id in self:
+            return self[id]
+
+        return default
+
+    def __setitem__(self, id: int, wts: wtsString, /):
+        self._added[id] = wts
+
+    def pop(self, id: int, /) -> wtsString:
+        if id in self._added:
+            return self._added.pop(id)
+
+        wts = self[id]
+        self._alive[self._row(id)] = 0
+        self._alive_count -= 1
+        del self._loaded[id]
+        return wts
+
+    def clear(self, /):
+        self._alive[:] = bytes(len(self._alive))
+        self._alive_count = 0
+        self._loaded.clear()
+        self._added.clear()
+
+    def comment_data(self, id: int, /) -> Optional[_CommentData]:
+        wts = self._added.get(id) or self._loaded.get(id)
+        if wts is not None:
+            return wts.comment_data
+
+        return self._comment_data(self._row(id))
+
+    def encoded(self, id: int, /) -> bytes:
+        """Return bytes of the string block as wtsStorage.save writes it"""
+        wts = self._added.get(id) or self._loaded.get(id)
+        if wts is None:
+            wts = self._decode(id, self._row(id))
+
+        return encode(wts)
 
 
 def parse_lines(lines: Iterable[str], /) -> Iterator[wtsString]:
@@ -92,31 +599,383 @@ def parse_lines(lines: Iterable[str], /) -> Iterator[wtsString]:
             content.write(line)
 
 
+# Same as blocks._BlockPattern, but for text with universal newlines
+_TextBlockPattern = re.compile(
+    r'^STRING ([^\n]*+)\n'
+    r'((?:// [^\n]*+\n)*+)'
+    r'((?>[^{\n][^\n]*+\n|\n)*+)'
+    r'\{[^\n]*+\n'
+    r'((?>[^}\n][^\n]*+\n|\n)*+)'
+    r'\}',
+    re.MULTILINE,
+)
+
+
+def parse_bytes(data: bytes, /) -> Iterator[wtsString]:
+    """
+    Parse bytes of a .wts file the same way parse_lines parses its lines read with universal newlines.
+    The file is decoded at once and all string blocks are found in one regex sweep.
+    """
+    text = data.decode(wtsStorage.file_encoding)
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+
+    for id, comment, extra, content in _TextBlockPattern.findall(text):
+        id = int(id)
+        if extra:
+            # STRING lines before the opening brace restart the block, but keep collected comment lines
+            for line in extra.splitlines(True):
+                if line.startswith('STRING '):
+                    id = int(line.strip()[7:])
+                elif line.startswith('// '):
+                    comment += line
+
+        yield wtsString(id, content, comment)
+
+
+def _block_texts(buffer, blocks: Iterable[Block], /) -> Iterator[tuple[int, str, str]]:
+    # Decode ids, comments and contents of scanned blocks the same way parse_lines reads them
+    crlf = b'\r' in buffer
+    for id, _, _, comment_start, comment_end, content_start, content_end, flags in blocks:
+        comment = buffer[comment_start:comment_end].decode('utf-8')
+        content = buffer[content_start:content_end].decode('utf-8')
+        if crlf:
+            comment = comment.replace('\r\n', '\n').replace('\r', '\n')
+            content = content.replace('\r\n', '\n').replace('\r', '\n')
+        if flags & FILTERED:
+            comment = ''.join(line for line in comment.splitlines(True) if line.startswith('// '))
+
+        yield id, comment, content
+
+
+_StringLine = re.compile(rb'[\r\n]STRING ')
+_ParsedString = tuple[int, str, str, Optional[tuple[str, str, str]]]
+
+
+def _parse_chunk(
+        filepath: str, start: int, end: int, newline: Optional[bytes], /,
+) -> tuple[list[_ParsedString], Optional[list[Block]], bool]:
+    """
+    Parse strings of a file part in a worker process.
+    Return strings as tuples of id, content, comment and comment data made of plain strings,
+    blocks with offsets in the file if newline is specified,
+    and whether the part ends outside of any string block.
+    """
+    with open(filepath, 'rb') as f:
+        f.seek(start)
+        buffer = f.read(end - start)
+
+    strings = []
+    blocks = list(scan_blocks(buffer, newline))
+    for id, comment, content in _block_texts(buffer, blocks):
+        # Enum members are slow to unpickle, pass their values instead
+        data = parse_comment(comment)
+        if data:
+            typ, rawcode, field = data
+            data = typ.value, rawcode, field.value
+
+        strings.append((id, content, comment, data))
+
+    # Lines after the last block are skipped by parse_lines unless one of them starts a new block
+    if blocks:
+        tail = blocks[-1][2]
+    else:
+        tail = len(BOM) if buffer[:len(BOM)] == BOM else 0
+
+    closed = not any(line.startswith(b'STRING ') for line in buffer[tail:].splitlines())
+    if newline is None:
+        blocks = None
+    else:
+        blocks = [(id, *(pos + start for pos in block[:6]), flags) for id, *block, flags in blocks]
+
+    return strings, blocks, closed
+
+
+def _parse_parallel(
+        filepath: str, data: bytes, newline: Optional[bytes], workers: int, /,
+) -> Optional[tuple[list[wtsString], Optional[list[Block]]]]:
+    """
+    Parse the file in parts split before STRING lines using a pool of worker processes.
+    Return parsed strings and blocks, or None if some part is split inside a string block.
+    """
+    bounds = [0]
+    for k in range(1, workers):
+        match = _StringLine.search(data, max(k * len(data) // workers, bounds[-1]))
+        if match is None:
+            break
+
+        bounds.append(match.start() + 1)
+
+    bounds.append(len(data))
+    count = len(bounds) - 1
+    with ProcessPoolExecutor(min(workers, count)) as executor:
+        parts = list(executor.map(
+            _parse_chunk, repeat(filepath, count), bounds[:-1], bounds[1:], repeat(newline, count),
+        ))
+
+    if not all(closed for _, _, closed in parts[:-1]):
+        return None
+
+    strings = []
+    for part, _, _ in parts:
+        for id, content, comment, data in part:
+            wts = wtsString(id, content, comment)
+            if data:
+                typ, rawcode, field = data
+                data = _types[typ], intern(rawcode), _fields[field]
+
+            wts._comment_data = data
+            strings.append(wts)
+
+    blocks = None if newline is None else list(chain.from_iterable(blocks for _, blocks, _ in parts))
+    return strings, blocks
+
+
+# Name of the string table inside map archives
+map_file: Final[str] = 'war3map.wts'
+_engines: Final[tuple[str, ...]] = 'lines', 'regex'
+# Files smaller than this are parsed serially even if workers are specified
+_parallel_threshold: Final[int] = 4 << 20
+# Layout of a file opened in full which is not scanned yet
+_NotScanned = object()
+
+# Number of strings sorted in memory by transform; larger files are sorted by merging sorted runs of this size
+_run_size: Final[int] = 50_000
+
+
+def _external_sort(strings: Iterator[wtsString], run_size: int, /) -> Iterator[wtsString]:
+    run = sorted(islice(strings, run_size))
+    if len(run) < run_size:
+        yield from run
+        return
+
+    with TemporaryDirectory() as directory, ExitStack() as stack:
+        runs = []
+        while run:
+            path = os.path.join(directory, f'{len(runs)}.wts')
+            with open(path, 'wb') as f:
+                for wts in run:
+                    f.write(encode(wts))
+
+            runs.append(parse_lines(stack.enter_context(open(path, encoding='utf-8'))))
+            run = sorted(islice(strings, run_size))
+
+        yield from merge_sorted(*runs)
+
+
+# Strings get increasing positions when a storage takes them, so positions follow the order of strings in it
+_positions = count(1)
+
+
+def _locked(method, /):
+    # Changes of wtsStorage hold its lock, so a snapshot is never taken in the middle of a change
+    @wraps(method)
+    def wrapper(self: 'wtsStorage', /, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+@final
+class wtsStorageView:
+    """
+    Read-only view of strings of a storage at the moment it was taken by wtsStorage.snapshot.
+    The view shares tables of strings and comments with the storage. Before adding, deleting or changing a string
+    the storage records the change in the view and copies the string or its comment record if the view needs them.
+    Reads take no lock: the view reads shared tables before its records, so a change made in between is recorded.
+    Strings are returned as copies which do not belong to any storage.
+    """
+    __slots__ = '_strings', '_comment_map', '_length', '_frozen', '_added', '_deleted', '_records', '__weakref__'
+
+    def __init__(self, strings: dict[int, wtsString], comment_map: _CommentMap, /):
+        self._strings = strings
+        self._comment_map = comment_map
+        self._length = len(strings)
+        # Copies of strings made before the storage changed or deleted them; copies keep positions of strings
+        self._frozen: dict[int, wtsString] = {}
+        # Ids of strings added to the storage after the view was taken, ids of deleted strings can be added again
+        self._added: set[int] = set()
+        # Ids of strings of the view deleted from the storage
+        self._deleted: set[int] = set()
+        # Records of the comment map made before the storage changed them, None if there was no record
+        self._records: dict[_CommentData, Optional[list[int]]] = {}
+
+    @staticmethod
+    def _copy(id: int, wts: wtsString, content: str, /) -> wtsString:
+        copy = wtsString(id, content, wts.comment)
+        copy._comment_data = wts.comment_data
+        return copy
+
+    def _freeze(self, wts: wtsString, /):
+        # Called by the storage before it changes a string
+        id = wts.id
+        if id not in self._frozen and id not in self._added:
+            copy = self._copy(id, wts, wts.content)
+            copy._position = wts._position
+            self._frozen[id] = copy
+
+    def _keep_record(self, data: Optional[_CommentData], /):
+        if data and data not in self._records:
+            record = self._comment_map[data]
+            self._records[data] = None if record is None else record.copy()
+
+    def _on_add(self, id: int, data: Optional[_CommentData], /):
+        # Called by the storage before it adds a string
+        self._keep_record(data)
+        self._added.add(id)
+
+    def _on_delete(self, wts: wtsString, /):
+        # Called by the storage before it deletes a string
+        self._keep_record(wts.comment_data)
+        if wts.id not in self._added:
+            self._freeze(wts)
+            self._deleted.add(wts.id)
+
+    def _position(self, id: int, /) -> int:
+        # Shared string is read first: if it is deleted in between, its copy is already made
+        wts = self._strings.get(id)
+        frozen = self._frozen.get(id)
+        return (wts if frozen is None else frozen)._position
+
+    def _ids(self, live: tuple[int, ...], data_check: Optional[Callable[[_CommentData], bool]] = None, /) -> list[int]:
+        # Ids must be read from shared tables before this call; deleted ids are placed back by their positions
+        added = self._added.copy()
+        deleted = self._deleted.copy()
+        ids = [id for id in live if id not in added and id not in deleted]
+        if data_check is not None:
+            frozen = self._frozen
+            deleted = [id for id in deleted if data_check(frozen[id].comment_data)]
+
+        if deleted:
+            position = self._position
+            ids = list(merge_sorted(ids, sorted(deleted, key=position), key=position))
+
+        return ids
+
+    def __len__(self, /) -> int:
+        return self._length
+
+    def __contains__(self, id: int, /) -> bool:
+        return (id in self._strings and id not in self._added) or id in self._deleted
+
+    def __getitem__(self, id: int, /) -> wtsString:
+        wts = self._strings.get(id)
+        # Content is read before the frozen copy is looked up:
+        # if the storage changes or deletes the string in between, the copy is already made
+        content = None if wts is None else wts.content
+        frozen = self._frozen.get(id)
+        if frozen is not None:
+            return self._copy(id, frozen, frozen.content)
+        if wts is None or id in self._added:
+            raise KeyError(id)
+
+        return self._copy(id, wts, content)
+
+    def __iter__(self, /) -> Iterator[wtsString]:
+        for id in self._ids(tuple(self._strings)):
+            yield self[id]
+
+    def find(self, typ: wtsCommentType, rawcode: str, field: wtsCommentField, /, level: int = 1) -> Optional[wtsString]:
+        key = typ, rawcode, field
+        ids = self._comment_map[key]
+        ids = None if ids is None else tuple(ids)
+        if key in self._records:
+            ids = self._records[key]
+        if ids is None:
+            return None
+
+        return self[ids[level - 1]]
+
+    def by_rawcode(self, rawcode: str, /) -> list[wtsString]:
+        """Return strings which comments refer to the given rawcode"""
+        live = tuple(self._comment_map.of_rawcode(rawcode))
+        return [self[id] for id in self._ids(live, lambda data: data is not None and data[1] == rawcode)]
+
+    def by_type(self, typ: wtsCommentType, /) -> list[wtsString]:
+        """Return strings which comments refer to objects of the given type"""
+        live = tuple(self._comment_map.of_type(typ))
+        return [self[id] for id in self._ids(live, lambda data: data is not None and data[0] is typ)]
+
+
 @final
 class wtsStorage:
-    __slots__ = '_strings', '_comment_map', '_free_indexes'
+    __slots__ = (
+        '_strings', '_comment_map', '_content_index', '_free_ids', '_dirty', '_layout', '_source', '_views', '_lock',
+    )
 
     file_encoding: Final[str] = 'utf-8-sig'
 
     def __init__(self, strings: Iterable[wtsString] = (), /):
-        self._strings: dict[int, wtsString] = {}
-        self._comment_map = _CommentMap()
+        self._strings: Union[dict[int, wtsString], _MappedStrings, _CompactStrings] = {}
         for wts in strings:
             if wts.id in self._strings:
                 raise wtsStorageError(f'id repeated: {self._strings[wts.id]!r} and {wts!r}')
 
-            self._add_string(wts)
+            self._own(wts)
+            self._strings[wts.id] = wts
+
+        self._comment_map: Optional[_CommentMap] = _CommentMap(
+            (wts.id, wts.comment_data) for wts in self._strings.values()
+        )
+        self._content_index: Optional[_ContentIndex] = None
+        self._free_ids = IdAllocator(self._strings.keys())
+        # Ids of strings added, deleted or changed since the file described by layout was read or written;
+        # layout of an opened file may be not scanned yet
+        self._dirty: set[int] = set()
+        self._layout: Optional[FileLayout] = None
+        # Absolute path and signature of the file which strings were last read from or written to
+        self._source: Optional[tuple[str, tuple[int, int]]] = None
+        # Views which are not garbage collected yet, they share tables with this storage
+        self._views: WeakSet[wtsStorageView] = WeakSet()
+        self._lock = RLock()
+
+    def _own(self, wts: wtsString, /):
+        if wts._storage is not None:
+            raise wtsStorageError(f'{wts!r} already belongs to a storage')
+
+        wts._storage = self
+        wts._position = next(_positions)
+
+    @_locked
+    def _change_content(self, wts: wtsString, value: str, /):
+        # Called by wtsString.content setter
+        if self._views:
+            self._freeze(wts)
+
+        self._dirty.add(wts.id)
+        if self._content_index is not None:
+            self._content_index.remove(wts.id, wts.content)
+            self._content_index.add(wts.id, value)
+
+        wts._content = value
+
+    def _freeze(self, wts: wtsString, /):
+        for view in self._views:
+            view._freeze(wts)
 
-        ids = self._strings.keys()
-        max_id = max(ids)
-        indexes = [max_id + 1]
+    def _detach_views(self, /):
+        # Views get copies of all strings and keep current tables, this storage must replace them with new ones
+        for wts in self._strings.values():
+            self._freeze(wts)
 
-        if max_id > len(self._strings):
-            for i in range(max_id - 1, 0, -1):
-                if i not in ids:
-                    indexes.append(i)
+        self._views = WeakSet()
 
-        self._free_indexes = indexes
+    @_locked
+    def snapshot(self, /) -> wtsStorageView:
+        """
+        Return a read-only view of current strings.
+        Taking a view is cheap: the view shares tables with the storage, a string or a comment record
+        is copied only before the storage changes it. Views can be read from other threads
+        while this storage is changed, reads never wait for its lock;
+        a view never reflects changes made after it was taken.
+        """
+        if type(self._strings) is not dict:
+            raise wtsStorageError('snapshots can be taken only of a fully loaded storage')
+
+        view = wtsStorageView(self._strings, self._comments())
+        self._views.add(view)
+        return view
 
     def __len__(self, /) -> int:
         return len(self._strings)
@@ -136,45 +995,647 @@ class wtsStorage:
     def __getitem__(self, id: int, /) -> wtsString:
         return self._strings[id]
 
+    def _comments(self, /) -> _CommentMap:
+        # Comment map of a lazy storage is built on first use
+        comment_map = self._comment_map
+        if comment_map is None:
+            strings = self._strings
+            comment_map = self._comment_map = _CommentMap((id, strings.comment_data(id)) for id in strings)
+
+        return comment_map
+
+    @_locked
     def _add_string(self, wts: wtsString, /):
+        self._own(wts)
+        for view in self._views:
+            view._on_add(wts.id, wts.comment_data)
+
         self._strings[wts.id] = wts
-        self._comment_map.add(wts)
+        self._dirty.add(wts.id)
+        if self._comment_map is not None:
+            self._comment_map.add(wts.id, wts.comment_data)
+        if self._content_index is not None:
+            self._content_index.add(wts.id, wts.content)
 
     def add(self, content: str, comment: str = '', /) -> wtsString:
-        id = self._free_indexes.pop()
-        if len(self._free_indexes) == 0:
-            self._free_indexes.append(id + 1)
-
+        id = self._free_ids.allocate()
         wts = wtsString(id, content, comment)
         self._add_string(wts)
         return wts
 
+    @_locked
+    def add_many(self, items: Iterable[tuple[str, str]], /) -> list[wtsString]:
+        """
+        Add strings from pairs of content and comment and return them.
+        Strings get consecutive ids if there is a large enough gap of free ids.
+        If any content is not a string or any comment cannot be parsed, no strings are added.
+        """
+        items = list(items)
+        if not items:
+            return []
+
+        # Validate all contents and comments before anything is changed
+        for i, (content, _) in enumerate(items):
+            if not isinstance(content, str):
+                raise TypeError(f'content must be a string, got {type(content)} for item {i}')
+
+        data = [parse_comment(comment) for _, comment in items]
+        views = list(self._views)
+        strings = self._strings
+        comment_map = self._comment_map
+        content_index = self._content_index
+        added = []
+        for id, (content, comment), comment_data in zip(self._free_ids.reserve(len(items)), items, data):
+            wts = wtsString(id, content, comment)
+            wts._comment_data = comment_data
+            wts._storage = self
+            wts._position = next(_positions)
+            for view in views:
+                view._on_add(id, comment_data)
+
+            strings[id] = wts
+            if comment_map is not None:
+                comment_map.add(id, comment_data)
+            if content_index is not None:
+                content_index.add(id, content)
+
+            added.append(wts)
+
+        self._dirty.update(wts.id for wts in added)
+        return added
+
+    @_locked
+    def update_many(self, contents: Union[Mapping[int, str], Iterable[tuple[int, str]]], /):
+        """
+        Set contents of strings from a mapping or pairs of id and content.
+        If any id is not present in the storage or any content is not a string, no strings are changed.
+        """
+        if isinstance(contents, Mapping):
+            contents = contents.items()
+
+        contents = list(contents)
+        strings = self._strings
+        missing = [id for id, _ in contents if id not in strings]
+        if missing:
+            noun, rep = repr_collection(missing, 'id', 'ids')
+            raise wtsStorageError(f'cannot update strings, {noun} {rep} not present in the storage')
+
+        for id, content in contents:
+            if not isinstance(content, str):
+                raise TypeError(f'content must be a string, got {type(content)} for id {id}')
+
+        for id, content in contents:
+            strings[id].content = content
+
+    @_locked
+    def delete_many(self, ids: Iterable[int], /):
+        """Delete strings with the given ids. If any id is not present in the storage, no strings are deleted"""
+        ids = list(dict.fromkeys(ids))
+        missing = [id for id in ids if id not in self._strings]
+        if missing:
+            noun, rep = repr_collection(missing, 'id', 'ids')
+            raise wtsStorageError(f'cannot delete strings, {noun} {rep} not present in the storage')
+
+        for id in ids:
+            del self[id]
+
+    @_locked
+    def collect_garbage(self, references: Iterable[int], /) -> list[int]:
+        """
+        Delete strings which ids are not among the referred ones and return sorted ids of deleted strings.
+        Referred ids can be collected with functions of module references.
+        """
+        references = set(references)
+        ids = sorted(id for id in self._strings if id not in references)
+        self.delete_many(ids)
+        return ids
+
+    @_locked
+    def compact_ids(self, /) -> dict[int, int]:
+        """
+        Renumber strings to ids from 1 to the number of strings keeping their order by id.
+        Return the mapping of old ids to new ones of renumbered strings;
+        functions of module references apply it to map files.
+        Lazy and compact storages are fully loaded.
+        """
+        strings = self._strings
+        if type(strings) is not dict:
+            loaded = {wts.id: wts for wts in strings.values()}
+            for wts in loaded.values():
+                wts._position = next(_positions)
+
+            if type(strings) is _MappedStrings:
+                strings.close()
+
+            self._strings = strings = loaded
+
+        mapping = {id: new for new, id in enumerate(sorted(strings), 1) if id != new}
+        if not mapping:
+            return mapping
+
+        if self._views:
+            # Views find strings by their ids
+            self._detach_views()
+
+        renumbered = {}
+        for id, wts in strings.items():
+            wts._id = mapping.get(id, id)
+            renumbered[wts._id] = wts
+
+        self._strings = renumbered
+        self._dirty.update(mapping.keys())
+        self._dirty.update(mapping.values())
+        self._comment_map = _CommentMap((wts.id, wts.comment_data) for wts in renumbered.values())
+        self._content_index = None
+        self._free_ids = IdAllocator(renumbered.keys())
+        return mapping
+
+    @_locked
     def __delitem__(self, id: int, /):
+        for view in self._views:
+            # Deleted string can be changed afterwards without notifying the storage
+            view._on_delete(self._strings[id])
+
         wts = self._strings.pop(id)
+        wts._storage = None
+        self._dirty.add(id)
         if id > 0:
-            self._free_indexes.append(id)
-            self._comment_map.remove(wts)
+            self._free_ids.release(id)
+            if self._comment_map is not None:
+                self._comment_map.remove(id, wts.comment_data)
+            if self._content_index is not None:
+                self._content_index.remove(id, wts.content)
 
+    @_locked
     def clear(self, /):
-        self._strings.clear()
-        self._comment_map.clear()
-        self._free_indexes = [1]
+        strings = self._strings
+        for wts in strings.values() if type(strings) is dict else strings.loaded():
+            wts._storage = None
+
+        self._dirty.update(strings.keys())
+        if self._views:
+            # Views keep current tables
+            self._detach_views()
+            self._strings = {}
+            self._comment_map = _CommentMap()
+        else:
+            strings.clear()
+            if self._comment_map is not None:
+                self._comment_map.clear()
+        if self._content_index is not None:
+            self._content_index.clear()
+
+        self._free_ids.clear()
+
+    @property
+    def modified(self, /) -> bool:
+        """
+        Whether strings were added, deleted or changed since the storage was opened or saved;
+        a storage which was neither opened from a file nor saved is modified
+        """
+        return self._source is None or bool(self._dirty)
 
     def find(self, typ: wtsCommentType, rawcode: str, field: wtsCommentField, /, level: int = 1) -> Optional[wtsString]:
         # If a string is changed in the editor, old string is removed, a new is appended to the end
         # This breaks the order of multilevel strings
         # It is possible to fix by using autofill on all levels
-        strings = self._comment_map[typ, rawcode, field]
-        if strings is None:
+        ids = self._comments()[typ, rawcode, field]
+        if ids is None:
             return None
 
-        return strings[level - 1]
+        return self._strings[ids[level - 1]]
+
+    def by_rawcode(self, rawcode: str, /) -> list[wtsString]:
+        """Return strings which comments refer to the given rawcode"""
+        strings = self._strings
+        return [strings[id] for id in self._comments().of_rawcode(rawcode)]
+
+    def by_type(self, typ: wtsCommentType, /) -> list[wtsString]:
+        """Return strings which comments refer to objects of the given type"""
+        strings = self._strings
+        return [strings[id] for id in self._comments().of_type(typ)]
+
+    def _transient(self, /) -> Iterator[wtsString]:
+        # Iterate over strings without loading strings of lazy and compact storages
+        strings = self._strings
+        return iter(strings.values()) if type(strings) is dict else strings.transient()
+
+    def diff(self, other: 'wtsStorage', /) -> wtsDiff:
+        """
+        Return the difference between this storage and the other one.
+        Strings with comments are matched by comment data and level, other strings are matched by id.
+        Only digests of texts are compared, lazy and compact storages are not loaded.
+        """
+        return wtsDiff(signatures(self._transient()), signatures(other._transient()))
+
+    @classmethod
+    def merge3(
+            cls,
+            base: 'wtsStorage',
+            ours: 'wtsStorage',
+            theirs: 'wtsStorage',
+            /,
+    ) -> tuple['wtsStorage', list[wtsConflict]]:
+        """
+        Merge changes made in our and their storages since the base one, such as generated and edited in the editor.
+        Strings are aligned like in diff; changes made only in one storage are applied.
+        Return the merged storage and conflicts; conflicting strings are taken from ours unless ours are deleted.
+        """
+        strings, conflicts = merge(base._transient(), ours._transient(), theirs._transient())
+        return cls(strings), conflicts
+
+    def search(self, text: str, /) -> list[wtsString]:
+        """
+        Return strings which content contains the text sorted by id.
+        Trigram index of contents is built on the first call and updated on every change since.
+        """
+        index = self._content_index
+        strings = self._strings
+        if index is None:
+            if type(strings) is _CompactStrings:
+                contents = strings.contents()
+            else:
+                contents = ((wts.id, wts.content) for wts in strings.values())
+
+            index = self._content_index = _ContentIndex(contents)
+
+        ids = index.candidates(text)
+        if ids is None:
+            ids = strings.keys()
+
+        return sorted(wts for id in ids if text in (wts := strings[id]).content)
+
+    @classmethod
+    def open(
+            cls,
+            filepath: str,
+            /,
+            *,
+            lazy: bool = False,
+            compact: bool = False,
+            engine: str = 'lines',
+            workers: int = 0,
+    ):
+        """
+        Open a .wts file.
+        Engine selects the parser of a fully loaded storage:
+        'lines' parses the file line by line, 'regex' finds all string blocks in its bytes at once.
+        If workers is greater than 1 and the file is large enough, the file is split into parts
+        before STRING lines; parts are parsed by the regex parser in a pool of this many processes.
+        If lazy is True, the file is memory-mapped and only offsets of its string blocks are read;
+        a string is decoded on first access, untouched strings are copied from the file on save.
+        If compact is True, strings are kept in arrays and shared buffers
+        and converted into wtsString only on access; this takes about three times less memory.
+        """
+        if lazy and compact:
+            raise ValueError('storage cannot be opened both lazy and compact')
+        if engine not in _engines:
+            raise ValueError(f'engine must be one of {", ".join(map(repr, _engines))}, got {engine!r}')
+        if workers > 1 and (lazy or compact):
+            raise ValueError('workers can be used only for a fully loaded storage')
+
+        if lazy or compact:
+            self = cls()
+            self._strings = (_MappedStrings if lazy else _CompactStrings)(self, filepath)
+            self._comment_map = None
+            self._free_ids = IdAllocator(self._strings.keys())
+            self._layout = self._strings.layout
+            self._set_source(filepath)
+            return self
+
+        with open(filepath, 'rb') as f:
+            data = f.read()
+
+        # Layout is needed only for incremental saves, it is scanned on the first one
+        layout = _NotScanned
+        parsed = None
+        if workers > 1 and len(data) >= _parallel_threshold:
+            newline = NEWLINE if uniform_newlines(data, NEWLINE) else None
+            parsed = _parse_parallel(filepath, data, newline, workers)
+
+        if parsed is not None:
+            strings, blocks = parsed
+            layout = None if blocks is None else FileLayout.from_blocks(filepath, data, blocks)
+            self = cls(strings)
+        elif engine == 'regex':
+            self = cls(parse_bytes(data))
+        else:
+            self = cls(parse_lines(StringIO(data.decode(cls.file_encoding), newline=None)))
+
+        self._layout = layout
+        self._set_source(filepath)
+        return self
+
+    @classmethod
+    def open_map(cls, archive: Union[str, MPQArchive], /):
+        """
+        Open war3map.wts of a map archive.
+        Archive can be given by a path or as an opened archive which is not closed afterwards.
+        """
+        if isinstance(archive, str):
+            with MPQArchive(archive) as archive:
+                return cls.open_map(archive)
+
+        return cls(parse_bytes(archive.read(map_file)))
+
+    @classmethod
+    def transform(
+            cls,
+            src: str,
+            dst: str,
+            func: Callable[[wtsString], Optional[wtsString]],
+            /,
+            *,
+            sort: bool = False,
+            run_size: int = _run_size,
+    ) -> int:
+        """
+        Pass every string of file src through func and write returned strings into file dst right away;
+        strings for which func returns None are dropped. Return the number of written strings.
+        Only a few strings are in memory at once; src and dst can be the same file.
+        If sort is True, strings are written in order of ids like save does;
+        files of more than run_size strings are sorted by merging sorted runs stored in temporary files.
+        """
+        count = 0
+        fd, temp = mkstemp(dir=os.path.dirname(os.path.abspath(dst)))
+        try:
+            with open(src, encoding=cls.file_encoding) as f, os.fdopen(fd, 'wb') as out:
+                strings = filter(None, map(func, parse_lines(f)))
+                if sort:
+                    strings = _external_sort(strings, run_size)
+
+                for wts in strings:
+                    if count == 0:
+                        out.write(BOM)
+
+                    out.write(encode(wts))
+                    count += 1
+        except BaseException:
+            os.remove(temp)
+            raise
+
+        # Temporary file is created with mode 0600, new dst gets the mode of src
+        shutil.copymode(dst if os.path.exists(dst) else src, temp)
+        os.replace(temp, dst)
+        return count
+
+    def _set_source(self, filepath: str, /):
+        self._source = os.path.abspath(filepath), file_signature(filepath)
+
+    def _file_layout(self, /) -> Optional[FileLayout]:
+        # Layout of the opened file is scanned on first need if the file is not changed since
+        layout = self._layout
+        if layout is _NotScanned:
+            layout = None
+            path, signature = self._source
+            if os.path.exists(path) and file_signature(path) == signature:
+                with open(path, 'rb') as f:
+                    data = f.read()
+
+                if uniform_newlines(data, NEWLINE):
+                    layout = FileLayout.from_blocks(path, data, list(scan_blocks(data, NEWLINE)))
+
+            self._layout = layout
+
+        return layout
+
+    def _encoded(self, id: int, /) -> bytes:
+        strings = self._strings
+        if type(strings) is dict:
+            return encode(strings[id])
+
+        return strings.encoded(id)
+
+    def _write(self, f: BinaryIO, ids: list[int], /) -> list[int]:
+        # Write blocks of strings with the given ids and return their starts
+        starts = []
+        pos = 0
+        if ids:
+            pos = f.write(BOM)
+
+        for id in ids:
+            starts.append(pos)
+            pos += f.write(self._encoded(id))
+
+        starts.append(pos)
+        return starts
+
+    def _save_all(self, filepath: str, /):
+        ids = sorted(self._strings)
+        strings = self._strings
+        if not (type(strings) is _MappedStrings and strings.maps(filepath)):
+            with open(filepath, 'wb') as f:
+                starts = self._write(f, ids)
+
+            self._layout = FileLayout(filepath, ids, starts)
+            return
+
+        # Mapped file is overwritten; write a new file near it and remap untouched blocks
+        fd, temp = mkstemp(dir=os.path.dirname(os.path.abspath(filepath)))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                starts = self._write(f, ids)
+        except BaseException:
+            os.remove(temp)
+            raise
+
+        shutil.copymode(filepath, temp)
+        strings.close()
+        try:
+            os.replace(temp, filepath)
+        finally:
+            strings.remap()
+
+        self._layout = FileLayout(filepath, ids, starts)
+
+    def _save_changes(self, filepath: str, /):
+        # Rewrite only changed blocks of the file described by the layout.
+        # Blocks of the same size are overwritten in place,
+        # otherwise the file is rewritten from the first block which size is changed.
+        layout = self._layout
+        ids = layout.ids
+        starts = layout.starts
+        strings = self._strings
+        patches = []
+        tail = -1
+        for id in sorted(self._dirty):
+            i = bisect_left(ids, id)
+            written = i < len(ids) and ids[i] == id
+            if id in strings:
+                data = self._encoded(id)
+                if written and len(data) == starts[i + 1] - starts[i]:
+                    patches.append((starts[i], data))
+                    continue
+            elif not written:
+                # Added and deleted since
+                continue
+
+            tail = i
+            tail_ids = sorted(key for key in strings if key >= id)
+            break
+
+        if not patches and tail == -1:
+            return
+
+        mapped = type(strings) is _MappedStrings and strings.maps(filepath)
+        if tail != -1 and mapped:
+            # Rewritten blocks are moved, copy them before the file is changed
+            tail_data = [self._encoded(id) for id in tail_ids]
+        else:
+            tail_data = None
+
+        if mapped:
+            strings.close()
+
+        try:
+            with open(filepath, 'r+b') as f:
+                for offset, data in patches:
+                    f.seek(offset)
+                    f.write(data)
+
+                if tail != -1:
+                    if tail == 0:
+                        f.seek(0)
+                        pos = f.write(BOM) if tail_ids else 0
+                    else:
+                        pos = starts[tail]
+                        f.seek(pos)
+
+                    new_starts = starts[:tail]
+                    for k, id in enumerate(tail_ids):
+                        new_starts.append(pos)
+                        pos += f.write(self._encoded(id) if tail_data is None else tail_data[k])
+
+                    new_starts.append(pos)
+                    f.truncate()
+                    layout.ids = ids[:tail] + array('q', tail_ids)
+                    layout.starts = new_starts
+        finally:
+            if mapped:
+                strings.remap()
+
+        layout.signature = file_signature(filepath)
+
+    def save(self, filepath: str, /, *, incremental: bool = True):
+        """
+        Save strings to a file sorted by id.
+        If the file was opened or saved by this storage and was not changed since,
+        only blocks of added, deleted and changed strings are rewritten,
+        the file is not written at all if there are no such strings.
+        Otherwise, or if incremental is False, the whole file is written.
+        """
+        layout = self._file_layout() if incremental else None
+        if layout is not None and layout.matches(filepath):
+            self._save_changes(filepath)
+        else:
+            self._save_all(filepath)
+
+        self._dirty.clear()
+        self._set_source(filepath)
+
+    def save_to_map(self, filepath: str, /, *, compact: bool = False):
+        """
+        Save strings to war3map.wts of a map archive.
+        The new string table is appended to the archive, other files of the archive are not touched.
+        If compact is True, the archive is rewritten afterwards to free space of the replaced string table.
+        """
+        data = BytesIO()
+        self._write(data, sorted(self._strings))
+        replace_file(filepath, map_file, data.getvalue())
+        if compact:
+            compact_archive(filepath)
+
+    def dump_snapshot(self, filepath: str, /):
+        """
+        Write strings, their comment data and free ids into a binary snapshot file.
+        The storage must not be changed since it was opened from or saved to a .wts file;
+        load_snapshot accepts the snapshot only while this file is not changed.
+        """
+        source = self._source
+        if source is None or self._dirty or file_signature(source[0]) != source[1]:
+            raise wtsStorageError('snapshot can be dumped only for a storage '
+                                  'which is not changed since its .wts file was opened or saved')
+
+        path, signature = source
+        strings = list(self)
+        keys: dict[_CommentData, int] = {}
+        comment_keys = array('I')
+        for wts in strings:
+            data = wts.comment_data
+            if data:
+                comment_keys.append(keys.setdefault(data, len(keys) + 1))
+            else:
+                comment_keys.append(0)
+
+        free_ids = self._free_ids
+        gaps = list(free_ids.gaps())
+        sections = {
+            'source': path.encode('utf-8'),
+            'signature': array('q', signature),
+            'hash': file_hash(path),
+            'ids': array('q', [wts.id for wts in strings]),
+            'comment_keys': comment_keys,
+            'gap_starts': array('q', [start for start, _ in gaps]),
+            'gap_ends': array('q', [end for _, end in gaps]),
+            'tail': array('q', [free_ids.tail]),
+        }
+        for name, texts in (
+                ('contents', (wts.content for wts in strings)),
+                ('comments', (wts.comment for wts in strings)),
+                ('key_types', (typ.value for typ, _, _ in keys)),
+                ('key_rawcodes', (rawcode for _, rawcode, _ in keys)),
+                ('key_fields', (field.value for _, _, field in keys)),
+        ):
+            sections[name], sections[f'{name}_ends'] = pack_texts(texts)
+
+        layout = self._file_layout()
+        if layout is not None:
+            sections['layout_ids'] = layout.ids
+            sections['layout_starts'] = layout.starts
+
+        write_snapshot(filepath, sections)
 
     @classmethod
-    def open(cls, filepath: str, /):
-        with open(filepath, 'r', encoding=cls.file_encoding) as f:
-            return cls(parse_lines(f))
+    def load_snapshot(cls, filepath: str, /):
+        """
+        Load a storage from a snapshot written by dump_snapshot.
+        Snapshot is rejected if its .wts file was changed since the snapshot was dumped;
+        a file with another modification time is accepted if its size and hash are the same.
+        """
+        sections = read_snapshot(filepath)
+        source = sections['source'].decode('utf-8')
+        if not os.path.exists(source):
+            raise wtsStorageError(f'.wts file {source!r} of snapshot {filepath!r} does not exist')
+
+        size, mtime = sections['signature']
+        signature = file_signature(source)
+        if signature != (size, mtime) and (signature[0] != size or file_hash(source) != sections['hash']):
+            raise wtsStorageError(f'snapshot {filepath!r} is outdated, .wts file {source!r} is changed')
+
+        def texts(name: str, /) -> list[str]:
+            return unpack_texts(sections[name], sections[f'{name}_ends'])
+
+        keys: list[Optional[_CommentData]] = [None]
+        for typ, rawcode, field in zip(texts('key_types'), texts('key_rawcodes'), texts('key_fields')):
+            keys.append((_types[typ], intern(rawcode), _fields[field]))
+
+        self = cls()
+        strings = self._strings
+        for id, content, comment, key in zip(
+                sections['ids'], texts('contents'), texts('comments'), sections['comment_keys'],
+        ):
+            wts = wtsString(id, content, comment)
+            wts._comment_data = keys[key]
+            wts._storage = self
+            wts._position = next(_positions)
+            strings[id] = wts
+
+        self._comment_map = _CommentMap((wts.id, wts._comment_data) for wts in strings.values())
+        self._free_ids = IdAllocator.from_gaps(
+            zip(sections['gap_starts'], sections['gap_ends']), sections['tail'][0],
+        )
+        if 'layout_ids' in sections:
+            self._layout = FileLayout(source, sections['layout_ids'], sections['layout_starts'])
 
-    def save(self, filepath: str, /):
-        with open(filepath, 'w', encoding=self.file_encoding) as f:
-            f.writelines(str(wts) for wts in sorted(self._strings.values()))
+        self._set_source(source)
+        return self
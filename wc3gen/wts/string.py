@@ -1,5 +1,7 @@
+import re
 from enum import Enum
-from typing import Optional, final
+from sys import intern
+from typing import Final, Optional, final
 
 from misclib.functions import truncate_string
 
@@ -51,13 +53,46 @@ class wtsCommentField(Enum):
 _CommentData = tuple[wtsCommentType, str, wtsCommentField]
 
 
+_CommentPattern = re.compile(r'// ([^:]+): (.{4}) \(.*\), (\S+) \([^()]*\)')
+_types: Final[dict[str, wtsCommentType]] = {t.value: t for t in wtsCommentType}
+_fields: Final[dict[str, wtsCommentField]] = {f.value: f for f in wtsCommentField}
+
+
+def _parse_comment_slow(comment: str, /) -> _CommentData:
+    colon = comment.index(':')
+    typ = wtsCommentType(comment[3:colon])
+    rawcode = comment[colon + 2:colon + 6]
+    closing_brace = comment.rindex(')', colon + 8, len(comment) - 2)
+    opening_brace = comment.index('(', closing_brace + 3)
+    field = wtsCommentField(comment[closing_brace + 3:opening_brace - 1])
+    return typ, intern(rawcode), field
+
+
+def parse_comment(comment: str, /) -> Optional[_CommentData]:
+    comment = comment.strip()
+    if not comment:
+        return None
+
+    match = _CommentPattern.fullmatch(comment)
+    if match is None:
+        return _parse_comment_slow(comment)
+
+    typ, rawcode, field = match.groups()
+    typ = _types.get(typ) or wtsCommentType(typ)
+    field = _fields.get(field) or wtsCommentField(field)
+    return typ, intern(rawcode), field
+
+
+_NotParsed = object()
+
+
 class wtsStringError(Exception):
     __module__ = 'builtins'
 
 
 @final
 class wtsString:
-    __slots__ = '_id', '_comment', '_content'
+    __slots__ = '_id', '_comment', '_content', '_comment_data', '_storage', '_position'
 
     def __init__(self, id: int, content: str, comment: str = '', /):
         if id < 0:
@@ -66,6 +101,9 @@ class wtsString:
         self._id = id
         self._comment = comment
         self._content = content
+        self._comment_data = _NotParsed
+        self._storage = None  # wtsStorage which contains this string
+        self._position = 0  # order in which the storage got this string
 
     @property
     def id(self, /) -> int:
@@ -77,17 +115,11 @@ class wtsString:
 
     @property
     def comment_data(self, /) -> Optional[_CommentData]:
-        comment = self._comment.strip()
-        if not comment:
-            return None
-
-        colon = comment.index(':')
-        typ = wtsCommentType(comment[3:colon])
-        rawcode = comment[colon + 2:colon + 6]
-        closing_brace = comment.rindex(')', colon + 8, len(comment) - 2)
-        opening_brace = comment.index('(', closing_brace + 3)
-        field = wtsCommentField(comment[closing_brace + 3:opening_brace - 1])
-        return typ, rawcode, field
+        data = self._comment_data
+        if data is _NotParsed:
+            data = self._comment_data = parse_comment(self._comment)
+
+        return data
 
     @property
     def content(self, /):
@@ -95,7 +127,11 @@ class wtsString:
 
     @content.setter
     def content(self, value: str, /):
-        self._content = value
+        if self._storage is not None and value != self._content:
+            # Storage changes the content itself, it may need the old value
+            self._storage._change_content(self, value)
+        else:
+            self._content = value
 
     def __str__(self, /) -> str:
         return (